@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'core',
     'user',
     'recipe',
+    'batch',
 ]
 
 MIDDLEWARE = [
@@ -134,3 +135,125 @@ MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
 AUTH_USER_MODEL = 'core.User'
+
+# Keep a per-user RecipeStats summary updated on every recipe change so the
+# stats endpoint reads one row instead of aggregating the user's recipes
+RECIPE_STATS_MATERIALIZED = False
+
+# Number of most used tags and ingredients reported by the stats endpoint
+RECIPE_STATS_TOP = 5
+
+# Maximum number of sub-requests accepted by a single batch call
+BATCH_MAX_REQUESTS = 20
+
+# Default and maximum number of rows per source in a delta sync page
+SYNC_PAGE_SIZE = 100
+SYNC_MAX_PAGE_SIZE = 1000
+# Seconds a change stays in sync pages before cursors may move past it, to
+# cover transactions committing after others with later timestamps
+SYNC_SETTLE_SECONDS = 60
+
+# Bounded pool hashing passwords for the token endpoint; logins beyond
+# workers + queue, or waiting longer than the timeout (seconds), get a 429
+LOGIN_HASHER_WORKERS = 4
+LOGIN_HASHER_QUEUE = 16
+LOGIN_HASHER_TIMEOUT = 5
+LOGIN_HASHER_RETRY_AFTER = 1
+
+# Admin changelists show the pg_class row estimate instead of running a
+# COUNT(*) once an unfiltered table is estimated above this many rows
+ADMIN_ESTIMATED_COUNT_MIN = 10000
+
+# Limits checked on recipe image uploads before any pixel is decoded
+RECIPE_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+RECIPE_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+
+# Widths served by /media/recipe/<id>/<width>w.webp and the on-disk cache
+# of rendered variants, evicted least recently used first over the budget
+RECIPE_IMAGE_WIDTHS = (160, 320, 640, 1280)
+RECIPE_IMAGE_CACHE_DIR = os.path.join(MEDIA_ROOT, 'cache', 'recipe')
+RECIPE_IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Partial files of resumable image uploads, removed by gc_media once the
+# upload is older than the expiry
+RECIPE_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'tmp', 'uploads')
+RECIPE_UPLOAD_EXPIRY_HOURS = 24
+
+# Weights of the ingredient and tag Jaccard indexes ranking similar recipes
+RECIPE_SIMILAR_WEIGHTS = {'ingredients': 0.7, 'tags': 0.3}
+RECIPE_SIMILAR_LIMIT = 10
+
+# Maximum number of recipes merged by a single shopping list
+RECIPE_SHOPPING_LIST_MAX = 50
+
+# Default and maximum number of ingredients listed as often used with one
+INGREDIENT_PAIRS_TOP = 10
+INGREDIENT_PAIRS_MAX_TOP = 50
+
+# Default and maximum page size of the keyset paginated recipe list
+RECIPE_PAGE_SIZE = 50
+RECIPE_MAX_PAGE_SIZE = 500
+
+# Maximum number of recipes created by one columnar bulk upload
+RECIPE_BULK_MAX = 1000
+
+# Maximum number of ids fetched at once with ?ids= on list endpoints
+MULTI_GET_MAX_IDS = 100
+
+# Background jobs: attempts before a job fails, exponential retry backoff
+# (seconds), idle poll interval, seconds after which a running job is
+# considered lost, and days finished jobs are kept
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10
+JOB_RETRY_BACKOFF_MAX = 60 * 60
+JOB_POLL_INTERVAL = 1
+JOB_TIMEOUT = 60 * 60
+JOB_KEEP_DAYS = 7
+# Tasks the workers queue periodically, with their interval in seconds
+JOB_SCHEDULE = {
+    'core.tasks.repair_recipe_counts': 24 * 60 * 60,
+    'core.tasks.build_ingredient_pairs': 24 * 60 * 60,
+    'core.tasks.prune_idempotency_keys': 60 * 60,
+    'core.tasks.prune_rate_buckets': 60 * 60,
+}
+
+# Seconds the first response to an Idempotency-Key is replayed to retries
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Token bucket rates per user (or address, when anonymous): reads, writes,
+# image uploads and logins each drain their own bucket
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': ('core.throttling.TokenBucketThrottle',),
+    'DEFAULT_THROTTLE_RATES': {
+        'read': '600/min',
+        'write': '120/min',
+        'upload': '60/min',
+        'login': '10/min',
+    },
+}
+
+# Databases recipe data is sharded over by user, the first one holding the
+# users placed before sharding. DB_SHARDS names extra databases on the same
+# server, each migrated with `migrate --database <name>`; the default
+# database stays the directory of users, tokens, jobs and throttles
+DATABASE_SHARDS = ['default']
+for name in filter(None, os.environ.get('DB_SHARDS', '').split(',')):
+    DATABASES[name] = dict(DATABASES['default'], NAME=name)
+    DATABASE_SHARDS.append(name)
+DATABASE_ROUTERS = ['core.sharding.ShardRouter']
+
+# Serialized recipes of the recipe list, keyed by id and revision. Bump the
+# VERSION of recipe_fragments whenever RecipeSerializer output changes
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipe_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipe-fragments',
+        'TIMEOUT': 24 * 60 * 60,
+        'VERSION': 1,
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
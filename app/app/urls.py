@@ -14,12 +14,21 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from recipe.views import resized_image
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
+    path('api/batch/', include('batch.urls')),
+    # Images go by their content name, as unguessable as the original URL
+    re_path(
+        r'^media/recipe/(?P<name>[0-9a-f]{64}\.\w+)/(?P<width>[0-9]+)w\.webp$',
+        resized_image,
+        name='recipe-image-resized'
+    ),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,13 @@
+from rest_framework.authentication import BaseAuthentication
+
+
+class BatchSubRequestAuthentication(BaseAuthentication):
+    """Authenticates a batch sub-request as its batch
+
+    The batch view sets `batch_auth` on the sub-requests it builds, to the
+    user and token of the authenticated batch. Requests from the network
+    never carry it.
+    """
+
+    def authenticate(self, request):
+        return getattr(request._request, 'batch_auth', None)
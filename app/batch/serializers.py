@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import serializers
+
+
+class SubRequestSerializer(serializers.Serializer):
+    """Serializer for a single request inside a batch"""
+    method = serializers.ChoiceField(
+        choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE'),
+        default='GET',
+    )
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+    def validate_path(self, value):
+        """Only API endpoints other than the batch itself can be batched"""
+        if not value.startswith('/api/') or value.startswith('/api/batch/'):
+            msg = _('Only API endpoints can be batched')
+            raise serializers.ValidationError(msg)
+
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    """Serializer for a batch of API requests"""
+    requests = SubRequestSerializer(many=True)
+
+    def validate_requests(self, value):
+        """Validate the batch is not empty and under the size cap"""
+        if not value:
+            raise serializers.ValidationError(_('The batch is empty'))
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            msg = _('A batch takes at most {max} requests').format(
+                max=settings.BATCH_MAX_REQUESTS
+            )
+            raise serializers.ValidationError(msg)
+
+        return value
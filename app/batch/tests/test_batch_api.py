@@ -0,0 +1,133 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Tag
+
+BATCH_URL = reverse('batch:batch')
+
+
+class PublicBatchApiTests(TestCase):
+    """Tests unauthenticated batch API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Tests that authentication is required for batches"""
+        res = self.client.post(BATCH_URL, {'requests': []}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateBatchApiTests(TestCase):
+    """Tests authenticated batch API access"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test123',
+            name='test'
+        )
+        self.client = APIClient()
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_batch_startup_calls(self):
+        """Tests running several reads in one batch"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        payload = {'requests': [
+            {'path': '/api/user/me/'},
+            {'method': 'GET', 'path': '/api/recipe/tags/?assigned_only=0'},
+            {'path': '/api/recipe/recipes/'},
+        ]}
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        me, tags, recipes = res.data['responses']
+        self.assertEqual(me['status'], status.HTTP_200_OK)
+        self.assertEqual(me['body']['email'], self.user.email)
+        self.assertEqual(tags['body'][0]['name'], 'Vegan')
+        self.assertEqual(recipes['body'], [])
+
+    def test_batch_per_request_status(self):
+        """Tests that each sub-request reports its own status"""
+        payload = {'requests': [
+            {'method': 'POST', 'path': '/api/recipe/tags/',
+             'body': {'name': 'Dessert'}},
+            {'method': 'POST', 'path': '/api/recipe/tags/', 'body': {}},
+            {'path': '/api/recipe/nowhere/'},
+        ]}
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        statuses = [sub['status'] for sub in res.data['responses']]
+        self.assertEqual(statuses, [
+            status.HTTP_201_CREATED,
+            status.HTTP_400_BAD_REQUEST,
+            status.HTTP_404_NOT_FOUND,
+        ])
+        self.assertTrue(
+            Tag.objects.filter(user=self.user, name='Dessert').exists()
+        )
+
+    def test_batch_sub_request_error_isolated(self):
+        """Tests that a failing sub-request does not fail the others"""
+        payload = {'requests': [
+            {'method': 'POST', 'path': '/api/recipe/tags/',
+             'body': {'name': 'Dessert'}},
+            {'path': '/api/recipe/recipes/?tags=abc'},
+            {'path': '/api/user/me/'},
+        ]}
+        with self.assertLogs('batch.views', 'ERROR'):
+            res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        created, failed, me = res.data['responses']
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertEqual(failed, {
+            'status': status.HTTP_500_INTERNAL_SERVER_ERROR,
+            'body': {'detail': 'Internal server error.'},
+        })
+        self.assertEqual(me['status'], status.HTTP_200_OK)
+        self.assertTrue(
+            Tag.objects.filter(user=self.user, name='Dessert').exists()
+        )
+
+    def test_batch_idempotency_key_per_request(self):
+        """Tests that a batch key gives each sub-request its own key"""
+        payload = {'requests': [
+            {'method': 'POST', 'path': '/api/recipe/tags/',
+             'body': {'name': name}}
+            for name in ('Vegan', 'Dessert')
+        ]}
+        responses = [
+            self.client.post(
+                BATCH_URL, payload, format='json', HTTP_IDEMPOTENCY_KEY='k1'
+            ).data['responses']
+            for _ in range(2)
+        ]
+
+        self.assertEqual(
+            [sub['status'] for sub in responses[0]],
+            [status.HTTP_201_CREATED] * 2
+        )
+        self.assertEqual(responses[1], responses[0])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_batch_size_capped(self):
+        """Tests that batches over the cap are rejected"""
+        payload = {'requests': [{'path': '/api/user/me/'}] * 3}
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_nested_batch_rejected(self):
+        """Tests that a batch cannot contain another batch"""
+        payload = {'requests': [{'method': 'POST', 'path': BATCH_URL}]}
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
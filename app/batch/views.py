@@ -0,0 +1,107 @@
+import hashlib
+import io
+import json
+import logging
+
+from django.http import HttpRequest, QueryDict
+from django.urls import resolve, Resolver404
+
+from rest_framework import generics, status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from batch.serializers import BatchSerializer
+
+logger = logging.getLogger(__name__)
+
+# Request META entries that belong to the outer request body or credentials
+SKIPPED_META = ('wsgi.input', 'CONTENT_TYPE', 'CONTENT_LENGTH',
+                'HTTP_AUTHORIZATION', 'QUERY_STRING', 'HTTP_IDEMPOTENCY_KEY')
+
+
+class BatchView(generics.GenericAPIView):
+    """Run several API requests in-process under one authentication"""
+    serializer_class = BatchSerializer
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        responses = [
+            self._dispatch(request, index, sub)
+            for index, sub in enumerate(serializer.validated_data['requests'])
+        ]
+
+        return Response({'responses': responses}, status=status.HTTP_200_OK)
+
+    def _build_request(self, request, index, method, path, query, body):
+        """Builds a sub-request sharing the authenticated user
+
+        An Idempotency-Key of the batch gives every sub-request its own key,
+        derived from it and the position of the sub-request.
+        """
+        sub_request = HttpRequest()
+        sub_request.method = method
+        sub_request.path = sub_request.path_info = path
+        sub_request.META = {
+            key: value for key, value in request.META.items()
+            if key not in SKIPPED_META
+        }
+        sub_request.META['REQUEST_METHOD'] = method
+        sub_request.META['QUERY_STRING'] = query
+        key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if key is not None:
+            digest = hashlib.sha256(key.encode()).hexdigest()
+            sub_request.META['HTTP_IDEMPOTENCY_KEY'] = \
+                f'batch:{digest}:{index}'
+        sub_request.GET = QueryDict(query)
+        sub_request.COOKIES = request.COOKIES
+
+        data = json.dumps(body).encode() if body is not None else b''
+        sub_request.META['CONTENT_TYPE'] = 'application/json'
+        sub_request.META['CONTENT_LENGTH'] = str(len(data))
+        sub_request._stream = io.BytesIO(data)
+        sub_request._read_started = False
+
+        sub_request.batch_auth = (request.user, request.auth)
+        return sub_request
+
+    def _dispatch(self, request, index, sub):
+        """Runs one sub-request through the URL routing
+
+        An exception escaping a sub-request is logged and reported as a 500
+        for that sub-request only, leaving the others to run.
+        """
+        path, _, query = sub['path'].partition('?')
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return {
+                'status': status.HTTP_404_NOT_FOUND,
+                'body': {'detail': 'Not found.'},
+            }
+
+        sub_request = self._build_request(
+            request, index, sub['method'], path, query, sub.get('body')
+        )
+        sub_request.resolver_match = match
+        try:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+        except Exception:
+            logger.exception('Batch sub-request %s %s failed',
+                             sub['method'], path)
+            return {
+                'status': status.HTTP_500_INTERNAL_SERVER_ERROR,
+                'body': {'detail': 'Internal server error.'},
+            }
+
+        if hasattr(response, 'data'):
+            body = response.data
+        elif response.content:
+            body = response.content.decode(response.charset)
+        else:
+            body = None
+
+        return {'status': response.status_code, 'body': body}
@@ -1,7 +1,45 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 from core import models
+from core.deletion import purge_user, purge_preview
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator trusting the planner row estimate on big unfiltered lists
+
+    Counting a large table is a full scan in PostgreSQL, while
+    pg_class.reltuples is kept up to date by ANALYZE/autovacuum.
+    """
+
+    def _estimated_count(self):
+        """Returns the planner row estimate of the listed table"""
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [self.object_list.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+
+        return int(row[0]) if row else None
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = self._estimated_count()
+            if estimate and estimate > settings.ADMIN_ESTIMATED_COUNT_MIN:
+                return estimate
+
+        return self.object_list.count()
 
 
 class UserAdmin(BaseUserAdmin):
@@ -23,8 +61,73 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+    def get_deleted_objects(self, objs, request):
+        """Summarizes the purge instead of collecting every related row"""
+        perms_needed = set()
+        if not self.has_delete_permission(request):
+            perms_needed.add(self.opts.verbose_name)
+
+        return [str(obj) for obj in objs], purge_preview(objs), \
+            perms_needed, []
+
+    def delete_model(self, request, obj):
+        purge_user(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            purge_user(user)
+
+
+class RecipeAttrAdmin(admin.ModelAdmin):
+    ordering = ['-id']
+    list_display = ['name', 'user', 'recipe_count']
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('recipe_count',)
+    search_fields = ('^name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class RecipeAdmin(admin.ModelAdmin):
+    ordering = ['-id']
+    list_display = ['title', 'user', 'time_minutes', 'price']
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('tags', 'ingredients')
+    search_fields = ('^title',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class JobAdmin(admin.ModelAdmin):
+    ordering = ['-id']
+    list_display = [
+        'id', 'task', 'status', 'attempts', 'run_at', 'finished_at'
+    ]
+    list_filter = ('status',)
+    search_fields = ('^task',)
+    readonly_fields = (
+        'attempts', 'created_at', 'started_at', 'finished_at', 'locked_by',
+        'last_error',
+    )
+    actions = ['retry_jobs']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def retry_jobs(self, request, queryset):
+        """Queues the selected jobs again with a fresh set of attempts"""
+        updated = queryset.exclude(status=models.Job.RUNNING).update(
+            status=models.Job.QUEUED,
+            attempts=0,
+            run_at=timezone.now(),
+        )
+        self.message_user(request, _('%d jobs queued again') % updated)
+    retry_jobs.short_description = _('Retry selected jobs')
+
 
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Recipe)
+admin.site.register(models.Tag, RecipeAttrAdmin)
+admin.site.register(models.Ingredient, RecipeAttrAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Job, JobAdmin)
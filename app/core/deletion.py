@@ -0,0 +1,164 @@
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Tag, Ingredient, Recipe, RecipeStats, Tombstone, \
+                        ImageUpload, IngredientPair, IdempotencyKey, \
+                        release_recipe_image
+from core.sharding import shard_for, use_shard
+
+
+def _delete_rows(queryset, report, limit=None):
+    """Deletes the rows of a queryset with a single DELETE statement
+
+    The rows are picked by a primary key subquery built by the ORM, so
+    nothing is loaded into Python and no delete signals are sent.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    table = model._meta.db_table
+    pks = queryset.values('pk')
+    if limit is not None:
+        pks = pks[:limit]
+    subquery, params = pks.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(table)} '
+            f'WHERE {connection.ops.quote_name(model._meta.pk.column)} '
+            f'IN ({subquery})',
+            params
+        )
+        report[table] += cursor.rowcount
+        return cursor.rowcount
+
+
+def _release_images(names):
+    """Releases the image files left by deleted recipes"""
+    for name in set(names):
+        release_recipe_image(name)
+
+
+def _purge_recipes(user_id, chunk_size, report):
+    """Deletes the recipes of a user and their through rows in chunks"""
+    recipes = Recipe.objects.filter(user_id=user_id)
+    while True:
+        with transaction.atomic(using=recipes.db):
+            rows = list(recipes.values_list('pk', 'image')[:chunk_size])
+            if not rows:
+                return
+            pks = [pk for pk, image in rows]
+            for through in (Recipe.tags.through, Recipe.ingredients.through):
+                _delete_rows(through.objects.filter(recipe_id__in=pks), report)
+            _delete_rows(Recipe.objects.filter(pk__in=pks), report)
+
+            images = [image for pk, image in rows if image]
+            if images:
+                transaction.on_commit(
+                    partial(_release_images, images), using=recipes.db
+                )
+
+        if len(rows) < chunk_size:
+            return
+
+
+def _purge_attrs(model, user_id, chunk_size, report):
+    """Deletes the tags or ingredients of a user in chunks
+
+    Recipes of other users still referencing them are marked as changed
+    and recounted, since they lose those through rows.
+    """
+    field_name = model._meta.model_name
+    through = Recipe._meta.get_field(f'{field_name}s').remote_field.through
+    attrs = model.objects.filter(user_id=user_id)
+    while True:
+        with transaction.atomic(using=attrs.db):
+            pks = list(attrs.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                return
+            links = through.objects.filter(**{f'{field_name}_id__in': pks})
+            recipe_pks = set(links.values_list('recipe_id', flat=True))
+            _delete_rows(links, report)
+            _delete_rows(model.objects.filter(pk__in=pks), report)
+            if recipe_pks:
+                Recipe.objects.refresh_attr_counts(recipe_pks)
+                Recipe.objects.filter(pk__in=recipe_pks).update(
+                    updated_at=timezone.now(),
+                    revision=F('revision') + 1,
+                )
+
+        if len(pks) < chunk_size:
+            return
+
+
+def _purge_owned(queryset, chunk_size, report):
+    """Deletes every row of a queryset, one transaction per chunk"""
+    while True:
+        with transaction.atomic(using=queryset.db):
+            deleted = _delete_rows(queryset, report, limit=chunk_size)
+        if deleted < chunk_size:
+            return
+
+
+def purge_user_data(user_id, chunk_size=1000, report=None):
+    """Deletes the recipe data of a user from the current shard"""
+    report = Counter() if report is None else report
+    # Partial upload files left behind are reclaimed by gc_media
+    _purge_owned(
+        ImageUpload.objects.filter(user_id=user_id), chunk_size, report
+    )
+    _purge_recipes(user_id, chunk_size, report)
+    _purge_owned(IngredientPair.objects.filter(
+        Q(user_id=user_id) |
+        Q(ingredient__user_id=user_id) |
+        Q(other__user_id=user_id)
+    ), chunk_size, report)
+    for model in (Tag, Ingredient):
+        _purge_attrs(model, user_id, chunk_size, report)
+    for model in (RecipeStats, Tombstone, IdempotencyKey):
+        _purge_owned(model.objects.filter(user_id=user_id), chunk_size, report)
+    return report
+
+
+def purge_user(user, chunk_size=1000):
+    """Deletes a user and all of their recipe data with set-based SQL
+
+    Tables are emptied in dependency order with chunked DELETEs, each chunk
+    in its own transaction, instead of loading every related object into
+    the deletion Collector. Image files are released once their rows are
+    committed, so files shared with other recipes stay. Recipe data goes
+    from the shard of the user, and the user itself from the directory.
+    Returns the number of rows deleted per table.
+    """
+    report = Counter()
+    with use_shard(shard_for(user)):
+        purge_user_data(user.pk, chunk_size, report)
+    _purge_owned(Token.objects.filter(user_id=user.pk), chunk_size, report)
+
+    # What is left (permissions, admin log) is small and goes through the
+    # regular Collector along with the user row itself
+    with transaction.atomic():
+        deleted, per_model = user.delete()
+    for label, count in per_model.items():
+        report[apps.get_model(label)._meta.db_table] += count
+
+    return {table: count for table, count in report.items() if count}
+
+
+def purge_preview(users):
+    """Counts the main rows purge_user would delete for some users"""
+    user_ids = defaultdict(list)
+    for user in users:
+        user_ids[shard_for(user)].append(user.pk)
+    counts = Counter()
+    for model in (Recipe, Tag, Ingredient):
+        for alias, pks in user_ids.items():
+            counts[model._meta.verbose_name_plural] += model.objects.using(
+                alias
+            ).filter(user_id__in=pks).count()
+    return dict(counts)
@@ -0,0 +1,93 @@
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import IdempotencyKey
+
+
+def request_fingerprint(request):
+    """Hashes what identifies a request besides its Idempotency-Key
+
+    Multipart bodies are left out so uploads keep streaming to their
+    handlers instead of being read in memory here.
+    """
+    sha = hashlib.sha256()
+    sha.update(request.method.encode())
+    sha.update(request.get_full_path().encode())
+    content_type = request.META.get('CONTENT_TYPE', '')
+    if content_type.startswith('multipart/'):
+        sha.update(request.META.get('CONTENT_LENGTH', '').encode())
+    else:
+        sha.update(request.body)
+
+    return sha.hexdigest()
+
+
+def idempotent(view_method):
+    """Replays the first response of a view to retries of the same key
+
+    The key row is inserted in the transaction running the view, so a
+    concurrent duplicate blocks on the unique index until the first
+    request commits its writes along with its response, then replays it.
+    Raised exceptions and 5xx responses roll the key back, so retries run
+    the view again.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if key is None:
+            return view_method(self, request, *args, **kwargs)
+        if not 0 < len(key) <= 255:
+            return Response(
+                {'detail': _('Idempotency-Key must be 1 to 255 characters')},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request)
+        keys = IdempotencyKey.objects.filter(user=request.user, key=key)
+        using = router.db_for_write(IdempotencyKey)
+        with transaction.atomic(using=using):
+            keys.filter(created_at__lt=timezone.now() - timedelta(
+                seconds=settings.IDEMPOTENCY_KEY_TTL
+            )).delete()
+            try:
+                with transaction.atomic(using=using):
+                    record = IdempotencyKey.objects.create(
+                        user=request.user, key=key, fingerprint=fingerprint
+                    )
+            except IntegrityError:
+                return _replay(keys.get(), fingerprint)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code >= 500:
+                record.delete()
+            else:
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=['status_code', 'response'])
+
+            return response
+
+    return wrapper
+
+
+def _replay(record, fingerprint):
+    """Returns the stored response of a key to a retry"""
+    if record.fingerprint != fingerprint:
+        return Response(
+            {'detail': _('Idempotency-Key was used for another request')},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    response = Response(record.response, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
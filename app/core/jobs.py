@@ -0,0 +1,132 @@
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two sweeps of lost, finished and periodic jobs by a worker
+MAINTENANCE_INTERVAL = 60
+
+_tasks = {}
+
+
+def task(func):
+    """Registers a function as a job task under its dotted path
+
+    The function gains an `enqueue(**kwargs)` shortcut.
+    """
+    name = f'{func.__module__}.{func.__qualname__}'
+    _tasks[name] = func
+    func.task_name = name
+    func.enqueue = partial(enqueue, name)
+    return func
+
+
+def get_task(name):
+    """Returns a registered task, importing its module when needed"""
+    if name not in _tasks:
+        import_string(name)
+    return _tasks[name]
+
+
+def enqueue(task, run_at=None, max_attempts=None, **kwargs):
+    """Queues a call of a task with JSON serializable keyword arguments
+
+    The job row is part of the current transaction, so it only becomes
+    visible to workers once the work that queued it is committed.
+    """
+    return Job.objects.create(
+        task=getattr(task, 'task_name', task),
+        payload=kwargs,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def retry_delay(attempts):
+    """Returns the exponential, jittered delay before the next attempt"""
+    delay = min(
+        settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.JOB_RETRY_BACKOFF_MAX
+    )
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def run_job(job):
+    """Runs a claimed job in a transaction and records its outcome
+
+    The transaction is on the default database, which holds the jobs.
+    Tasks writing to shards open their own transactions there.
+    """
+    try:
+        func = get_task(job.task)
+        with transaction.atomic():
+            func(**job.payload)
+    except Exception:
+        logger.exception('Job %s failed on attempt %d', job, job.attempts)
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+        job.last_error = ''
+
+    job.locked_by = ''
+    job.save(update_fields=[
+        'status', 'run_at', 'finished_at', 'locked_by', 'last_error'
+    ])
+    return job.status
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def work(stop=None, burst=False):
+    """Runs due jobs until `stop` is set, or until none is due with burst
+
+    Returns the number of jobs run.
+    """
+    worker = worker_name()
+    processed = 0
+    maintained_at = None
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        if maintained_at is None or \
+                time.monotonic() - maintained_at > MAINTENANCE_INTERVAL:
+            Job.objects.requeue_stale()
+            Job.objects.prune()
+            Job.objects.schedule(settings.JOB_SCHEDULE)
+            maintained_at = time.monotonic()
+
+        job = Job.objects.claim(worker)
+        if job is None:
+            if burst:
+                break
+            if stop is None:
+                time.sleep(settings.JOB_POLL_INTERVAL)
+            else:
+                stop.wait(settings.JOB_POLL_INTERVAL)
+            continue
+
+        run_job(job)
+        processed += 1
+
+    return processed
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import IngredientPair
+from core.sharding import each_shard
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the ingredient co-occurrence counts"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Only rebuild the pairs of this user id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        created = 0
+        for alias in each_shard():
+            with transaction.atomic(using=alias):
+                created += IngredientPair.objects.rebuild(options['users'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {created} ingredient pairs'
+        ))
@@ -0,0 +1,171 @@
+import os
+import shutil
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Recipe, ImageUpload, RECIPE_IMAGE_DIR, lock_image
+
+# Orphan candidates checked again and removed per transaction, each one
+# holding an advisory lock per shard until then
+REMOVE_BATCH = 100
+
+
+class Command(BaseCommand):
+    """Django command to remove recipe image files nothing references"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Only touch orphans not modified for this many hours',
+        )
+        parser.add_argument(
+            '--quarantine',
+            help='Move orphans under this directory instead of deleting',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def _walk(self, path):
+        """Yields the files under a directory without listing it all"""
+        try:
+            entries = os.scandir(path)
+        except FileNotFoundError:
+            return
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._walk(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    def _referenced(self, chunk_size):
+        """Loads the image names of every shard with chunked scans"""
+        referenced = set()
+        for alias in settings.DATABASE_SHARDS:
+            images = Recipe.objects.using(alias).exclude(
+                image__isnull=True
+            ).exclude(image='').values_list('image', flat=True)
+            referenced.update(images.iterator(chunk_size=chunk_size))
+        return referenced
+
+    def _remove(self, batch, cutoff, options):
+        """Removes the candidates of a batch still orphaned and old
+
+        Names are checked again under their image locks, as recipes may
+        have started referencing them since the references were loaded.
+        Returns the sizes of the removed files.
+        """
+        sizes = []
+        with ExitStack() as stack:
+            for alias in settings.DATABASE_SHARDS:
+                stack.enter_context(transaction.atomic(using=alias))
+                for name in sorted(batch):
+                    lock_image(name, alias)
+            referenced = set()
+            for alias in settings.DATABASE_SHARDS:
+                referenced.update(Recipe.objects.using(alias).filter(
+                    image__in=list(batch)
+                ).values_list('image', flat=True))
+
+            for name, path in batch.items():
+                if name in referenced:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime > cutoff:
+                    continue
+
+                if not options['dry_run']:
+                    if options['quarantine']:
+                        target = os.path.join(options['quarantine'], name)
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        shutil.move(path, target)
+                    else:
+                        os.remove(path)
+                sizes.append(stat.st_size)
+
+        return sizes
+
+    def _expire_uploads(self, cutoff, dry_run):
+        """Drops expired resumable uploads and partial files without row"""
+        count = 0
+        live = set()
+        for alias in settings.DATABASE_SHARDS:
+            uploads = ImageUpload.objects.using(alias)
+            expired = uploads.filter(created_at__lt=timezone.now() - (
+                timedelta(hours=settings.RECIPE_UPLOAD_EXPIRY_HOURS)
+            ))
+            count += expired.count()
+            if not dry_run:
+                expired.delete()
+            live.update(
+                f'{pk}.part' for pk in uploads.values_list('pk', flat=True)
+            )
+
+        for entry in self._walk(settings.RECIPE_UPLOAD_TEMP_DIR):
+            if entry.name in live:
+                continue
+            if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                continue
+            if not dry_run:
+                os.remove(entry.path)
+            count += 1
+
+        return count
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        root = storage.path('')
+        cutoff = time.time() - options['grace_hours'] * 3600
+        started = time.perf_counter()
+        referenced = self._referenced(options['chunk_size'])
+
+        scanned = orphans = young = 0
+        sizes = []
+        batch = {}
+        for entry in self._walk(os.path.join(root, RECIPE_IMAGE_DIR)):
+            scanned += 1
+            name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+            if name in referenced:
+                continue
+
+            orphans += 1
+            if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                young += 1
+                continue
+
+            batch[name] = entry.path
+            if len(batch) >= REMOVE_BATCH:
+                sizes += self._remove(batch, cutoff, options)
+                batch = {}
+        if batch:
+            sizes += self._remove(batch, cutoff, options)
+        removed, reclaimed = len(sizes), sum(sizes)
+
+        uploads = self._expire_uploads(cutoff, options['dry_run'])
+        elapsed = time.perf_counter() - started
+        action = 'quarantined' if options['quarantine'] else 'deleted'
+        if options['dry_run']:
+            action = f'would be {action}'
+        self.stdout.write(
+            f'Scanned {scanned} files against {len(referenced)} references '
+            f'in {elapsed:.2f}s ({scanned / max(elapsed, 1e-9):.0f} files/s)'
+        )
+        self.stdout.write(
+            f'Found {orphans} orphans, {young} within the grace period'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{removed} orphans {action}, {reclaimed} bytes reclaimed'
+        ))
+        self.stdout.write(
+            f'{uploads} expired or abandoned uploads '
+            f'{"would be " if options["dry_run"] else ""}deleted'
+        )
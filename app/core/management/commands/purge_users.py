@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.deletion import purge_user
+
+
+class Command(BaseCommand):
+    """Django command to delete users and all of their recipe data"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'users', nargs='+',
+            help='Emails or ids of the users to delete',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def _get_user(self, identifier):
+        user_model = get_user_model()
+        lookup = {'pk': identifier} if identifier.isdigit() else {
+            'email': identifier
+        }
+        try:
+            return user_model.objects.get(**lookup)
+        except user_model.DoesNotExist:
+            raise CommandError(f'User {identifier} does not exist')
+
+    def handle(self, *args, **options):
+        users = [self._get_user(identifier) for identifier in options['users']]
+        for user in users:
+            self.stdout.write(f'Purging {user.email}...')
+            report = purge_user(user, chunk_size=options['chunk_size'])
+            for table, count in sorted(report.items()):
+                self.stdout.write(f'  {table}: {count}')
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {len(users)} users'))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.rebalance import move_user
+
+
+class Command(BaseCommand):
+    """Django command to move the recipe data of a user to another shard"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='Email or id of the user to move')
+        parser.add_argument('shard', help='Database alias of the new shard')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['shard'] not in settings.DATABASE_SHARDS:
+            raise CommandError(f'{options["shard"]} is not a shard')
+
+        user_model = get_user_model()
+        identifier = options['user']
+        lookup = {'pk': identifier} if identifier.isdigit() else {
+            'email': identifier
+        }
+        try:
+            user = user_model.objects.get(**lookup)
+        except user_model.DoesNotExist:
+            raise CommandError(f'User {identifier} does not exist')
+
+        report = move_user(user, options['shard'], options['chunk_size'])
+        for table, count in sorted(report.items()):
+            self.stdout.write(f'  {table}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{user.email} is on {options["shard"]}'
+        ))
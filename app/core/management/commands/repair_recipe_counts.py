@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Tag, Ingredient, Recipe, RecipeStats
+from core.sharding import each_shard
+
+
+class Command(BaseCommand):
+    """Django command to recompute the recipe counters of tags/ingredients"""
+
+    def handle(self, *args, **options):
+        for alias in each_shard():
+            self._repair(alias)
+
+        self.stdout.write(self.style.SUCCESS('Recipe counters repaired'))
+
+    def _repair(self, alias):
+        """Repairs the counters stored on one shard"""
+        for model in (Tag, Ingredient):
+            with transaction.atomic(using=alias):
+                updated = model.objects.refresh_recipe_count()
+            self.stdout.write(
+                f'Recomputed recipe_count for {updated} '
+                f'{model._meta.verbose_name_plural}'
+            )
+
+        with transaction.atomic(using=alias):
+            updated = Recipe.objects.refresh_attr_counts()
+        self.stdout.write(
+            f'Recomputed tag_count/ingredient_count for {updated} recipes'
+        )
+
+        # Summaries are rebuilt from the recipes on their next read
+        deleted, _ = RecipeStats.objects.all().delete()
+        self.stdout.write(f'Dropped {deleted} materialized recipe stats')
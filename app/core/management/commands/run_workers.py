@@ -0,0 +1,54 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils.module_loading import autodiscover_modules
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    """Django command to run background jobs in a pool of processes"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Number of worker processes',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no job is due instead of waiting for more',
+        )
+
+    def handle(self, *args, **options):
+        autodiscover_modules('tasks')
+        concurrency = max(options['concurrency'], 1)
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+
+        # Installed before forking so every worker finishes its current job
+        # and exits on SIGINT/SIGTERM
+        def shutdown(signum, frame):
+            stop.set()
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        if concurrency == 1:
+            processed = jobs.work(stop, options['burst'])
+            self.stdout.write(self.style.SUCCESS(f'Ran {processed} jobs'))
+            return
+
+        # Children must open their own database connections
+        connections.close_all()
+        workers = [
+            context.Process(target=jobs.work, args=(stop, options['burst']))
+            for _ in range(concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Started {concurrency} workers')
+        for worker in workers:
+            worker.join()
+
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
@@ -0,0 +1,52 @@
+# Generated by Django 2.1.15 on 2026-10-18 21:51
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_recipe_counts(apps, schema_editor):
+    """Computes the initial recipe counters of tags and ingredients"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name in ('Tag', 'Ingredient'):
+        field_name = model_name.lower()
+        through = Recipe._meta.get_field(f'{field_name}s').remote_field.through
+        counts = through.objects.filter(
+            **{f'{field_name}_id': OuterRef('pk')}
+        ).values(f'{field_name}_id').annotate(
+            count=Count('*')
+        ).values('count')
+        apps.get_model('core', model_name).objects.update(
+            recipe_count=Coalesce(
+                Subquery(counts, output_field=models.IntegerField()), 0
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_ingred_user_id_de1121_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_tag_user_id_699afc_idx'),
+        ),
+        migrations.RunPython(fill_recipe_counts, migrations.RunPython.noop),
+    ]
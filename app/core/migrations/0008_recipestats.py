@@ -0,0 +1,29 @@
+# Generated by Django 2.1.15 on 2026-10-18 21:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_auto_20261018_2151'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recipe_count', models.IntegerField(default=0)),
+                ('time_minutes_total', models.BigIntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('price_under_5', models.IntegerField(default=0)),
+                ('price_5_to_10', models.IntegerField(default=0)),
+                ('price_10_to_20', models.IntegerField(default=0)),
+                ('price_20_to_50', models.IntegerField(default=0)),
+                ('price_over_50', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.1.15 on 2026-10-18 22:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_attr_counts(apps, schema_editor):
+    """Computes the initial tag and ingredient counters of recipes"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for field_name in ('tags', 'ingredients'):
+        through = Recipe._meta.get_field(field_name).remote_field.through
+        counts = through.objects.filter(
+            recipe_id=OuterRef('pk')
+        ).values('recipe_id').annotate(count=Count('*')).values('count')
+        Recipe.objects.update(**{
+            f'{field_name[:-1]}_count': Coalesce(
+                Subquery(counts, output_field=models.IntegerField()), 0
+            )
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_imageupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_attr_counts, migrations.RunPython.noop),
+    ]
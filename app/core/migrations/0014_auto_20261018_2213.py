@@ -0,0 +1,33 @@
+# Generated by Django 2.1.15 on 2026-10-18 22:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_auto_20261018_2210'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientPair',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.Ingredient')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.Ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ingredientpair',
+            index=models.Index(fields=['user', 'ingredient', '-count'], name='core_ingred_user_id_81000b_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ingredientpair',
+            unique_together={('user', 'ingredient', 'other')},
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.1.15 on 2026-10-18 22:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_auto_20261018_2222'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateBucket',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunSQL(
+            'ALTER TABLE core_ratebucket SET UNLOGGED',
+            'ALTER TABLE core_ratebucket SET LOGGED',
+        ),
+    ]
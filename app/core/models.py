@@ -1,16 +1,54 @@
 import uuid
 import os
-from django.db import models
+from collections import Counter
+from contextlib import ExitStack
+from itertools import permutations
+from decimal import Decimal
+from datetime import timedelta
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import JSONField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, router, transaction
+from django.db.models import Count, ExpressionWrapper, F, OuterRef, Q, \
+                             Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                         PermissionsMixin
 from django.conf import settings
 
+from core.sharding import place_user
+from core.storage import ContentAddressedStorage
+
+
+# Directory of the recipe image files, relative to MEDIA_ROOT
+RECIPE_IMAGE_DIR = 'uploads/recipe'
+
+# Advisory lock class serializing the saves and releases of an image file
+IMAGE_LOCK = 4035
+
+# Price distribution buckets as (field name, lower bound, upper bound)
+RECIPE_PRICE_BUCKETS = (
+    ('price_under_5', None, 5),
+    ('price_5_to_10', 5, 10),
+    ('price_10_to_20', 10, 20),
+    ('price_20_to_50', 20, 50),
+    ('price_over_50', 50, None),
+)
+
+
+def recipe_price_bucket(price):
+    """Returns the price bucket field name for a recipe price"""
+    for name, lower, upper in RECIPE_PRICE_BUCKETS:
+        if upper is None or price < upper:
+            return name
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image"""
     ext = filename.split('.')[-1]
     filename = f'{uuid.uuid4()}.{ext}'
-    return os.path.join('uploads/recipe/', filename)
+    return os.path.join(RECIPE_IMAGE_DIR, filename)
 
 
 class UserManager(BaseUserManager):
@@ -22,6 +60,9 @@ class UserManager(BaseUserManager):
         user = self.model(email=self.normalize_email(email), **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
+        if len(settings.DATABASE_SHARDS) > 1:
+            user.shard = place_user(user.pk)
+            user.save(using=self._db, update_fields=['shard'])
         return user
 
     def create_superuser(self, email, password):
@@ -41,19 +82,62 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     # is_superuser = models.BooleanField(default=False)
+    # Database holding the recipe data of the user, see core.sharding
+    shard = models.CharField(max_length=64, blank=True)
 
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
 
 
+class RecipeAttrManager(models.Manager):
+    """Manager for recipe attributes with a denormalized recipe_count"""
+
+    def refresh_recipe_count(self, pks=None):
+        """Recomputes recipe_count from the recipe through table
+
+        Only the rows in `pks` are checked, or every row when it is None,
+        and only rows whose counter drifted are written.
+        """
+        field_name = self.model._meta.model_name
+        through = Recipe._meta.get_field(f'{field_name}s').remote_field.through
+        counts = through.objects.filter(
+            **{f'{field_name}_id': OuterRef('pk')}
+        ).values(f'{field_name}_id').annotate(
+            count=Count('*')
+        ).values('count')
+        recipe_count = Coalesce(
+            Subquery(counts, output_field=models.IntegerField()), 0
+        )
+        queryset = self.get_queryset()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+
+        return queryset.exclude(recipe_count=recipe_count).update(
+            recipe_count=recipe_count,
+            updated_at=timezone.now(),
+        )
+
+
 class Tag(models.Model):
     """Tag to be used for a recipe"""
     name = models.CharField(max_length=255, unique=True)
+    # Users live in the directory database, which shards cannot reference
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False,
     )
+    recipe_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeAttrManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'recipe_count']),
+            models.Index(fields=['user', 'updated_at']),
+        ]
 
     def __str__(self):
         return self.name
@@ -65,18 +149,142 @@ class Ingredient(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False,
     )
+    recipe_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    objects = RecipeAttrManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'recipe_count']),
+            models.Index(fields=['user', 'updated_at']),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeManager(models.Manager):
+    """Manager for recipes with denormalized tag and ingredient counts"""
+
+    def _attr_counts(self):
+        """Returns expressions counting the tags and ingredients of a row"""
+        counts = {}
+        for field_name in ('tags', 'ingredients'):
+            through = self.model._meta.get_field(
+                field_name
+            ).remote_field.through
+            rows = through.objects.filter(
+                recipe_id=OuterRef('pk')
+            ).values('recipe_id').annotate(count=Count('*')).values('count')
+            counts[f'{field_name[:-1]}_count'] = Coalesce(
+                Subquery(rows, output_field=models.IntegerField()), 0
+            )
+        return counts
+
+    def refresh_attr_counts(self, pks=None):
+        """Recomputes tag_count and ingredient_count from the through tables
+
+        Only the rows in `pks` are checked, or every row when it is None,
+        and only rows whose counters drifted are written.
+        """
+        counts = self._attr_counts()
+        drifted = Q()
+        for name, count in counts.items():
+            drifted |= ~Q(**{name: count})
+        queryset = self.get_queryset()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+
+        return queryset.filter(drifted).update(**counts)
+
+    def similar_to(self, recipe):
+        """Ranks the other recipes of the owner by similarity to `recipe`
+
+        The score is the weighted sum of the Jaccard index of ingredients
+        and tags. The through tables, indexed by tag and ingredient, act as
+        the inverted index: only recipes sharing something are scored, and
+        the denormalized counts give the size of their sets.
+        """
+        candidates = Q()
+        shared = {}
+        sizes = {}
+        for field_name, weight in settings.RECIPE_SIMILAR_WEIGHTS.items():
+            attr = field_name[:-1]
+            through = self.model._meta.get_field(
+                field_name
+            ).remote_field.through
+            attr_pks = list(through.objects.filter(
+                recipe_id=recipe.pk
+            ).values_list(f'{attr}_id', flat=True))
+            if not attr_pks or not weight:
+                continue
+
+            links = through.objects.filter(**{f'{attr}_id__in': attr_pks})
+            rows = links.filter(
+                recipe_id=OuterRef('pk')
+            ).values('recipe_id').annotate(count=Count('*')).values('count')
+            shared[f'shared_{field_name}'] = Coalesce(
+                Subquery(rows, output_field=models.IntegerField()), 0
+            )
+            sizes[field_name] = len(attr_pks)
+            candidates |= Q(pk__in=links.values('recipe_id'))
+
+        if not shared:
+            return self.none()
+
+        similarity = Value(0.0, output_field=models.FloatField())
+        for field_name, size in sizes.items():
+            common = F(f'shared_{field_name}')
+            union = F(f'{field_name[:-1]}_count') + size - common
+            weight = settings.RECIPE_SIMILAR_WEIGHTS[field_name]
+            jaccard = Cast(common, models.FloatField()) / Greatest(union, 1)
+            similarity += ExpressionWrapper(
+                weight * jaccard,
+                output_field=models.FloatField()
+            )
+
+        return self.filter(candidates, user_id=recipe.user_id).exclude(
+            pk=recipe.pk
+        ).annotate(**shared).annotate(
+            similarity=similarity
+        ).order_by('-similarity', '-id')
+
+    def image_name(self, pk):
+        """Returns the image of a recipe, looking it up on every shard"""
+        for alias in settings.DATABASE_SHARDS:
+            image = self.using(alias).filter(pk=pk).values_list(
+                'image', flat=True
+            ).first()
+            if image:
+                return image
+        return None
+
+    def shopping_list(self, user, pks):
+        """Merges the ingredients of some recipes of a user
+
+        One grouped query over the ingredients through table returns each
+        ingredient once, with the ids of the recipes using it.
+        """
+        through = self.model.ingredients.through
+        return through.objects.filter(
+            recipe_id__in=pks,
+            recipe__user=user,
+        ).values('ingredient_id').annotate(
+            name=F('ingredient__name'),
+            recipes=ArrayAgg('recipe_id'),
+            recipe_count=Count('recipe_id'),
+        ).order_by('name', 'ingredient_id')
+
+
 class Recipe(models.Model):
     """Recipe object"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete = models.CASCADE
+        on_delete = models.CASCADE,
+        db_constraint=False,
     )
 
     title = models.CharField(max_length=255)
@@ -85,7 +293,526 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=ContentAddressedStorage(),
+        db_index=True,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    tag_count = models.PositiveIntegerField(default=0)
+    ingredient_count = models.PositiveIntegerField(default=0)
+    # Bumped by every change to the serialized recipe, see recipe.fragments
+    revision = models.PositiveIntegerField(default=0)
+
+    objects = RecipeManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+            # One per sort order of the recipe list, id breaking ties
+            models.Index(fields=['user', 'title', 'id']),
+            models.Index(fields=['user', 'time_minutes', 'id']),
+            models.Index(fields=['user', 'price', 'id']),
+            models.Index(fields=['user', 'id']),
+        ]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Keeps the loaded values around to compute deltas on save"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Bumps the revision of existing recipes in the UPDATE itself
+
+        The new revision is loaded again on access, since concurrent saves
+        may have bumped it too. A new image file is stored and referenced
+        under its lock, so it cannot be released in between.
+        """
+        if self.image and not self.image._committed:
+            using = kwargs.get('using') or \
+                router.db_for_write(Recipe, instance=self)
+            field = self._meta.get_field('image')
+            name = field.storage.content_name(
+                field.generate_filename(self, self.image.name), self.image
+            )
+            with transaction.atomic(using=using):
+                lock_image(name, using, shared=True)
+                return self._save_revision(*args, **kwargs)
+
+        return self._save_revision(*args, **kwargs)
+
+    def _save_revision(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        self.revision = F('revision') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'revision'}
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            del self.revision
+
+
+def lock_image(name, using, shared=False):
+    """Takes the lock of an image file until the transaction ends"""
+    suffix = '_shared' if shared else ''
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT pg_advisory_xact_lock{suffix}(%s, hashtext(%s))',
+            [IMAGE_LOCK, name]
+        )
+
+
+def release_recipe_image(name):
+    """Deletes a stored image once no recipe of any shard references it
+
+    The lock of the file is taken on every shard first, so saves storing
+    the same content either commit their reference before the check or
+    find the file gone and write it again.
+    """
+    if not name:
+        return
+
+    with ExitStack() as stack:
+        for alias in settings.DATABASE_SHARDS:
+            stack.enter_context(transaction.atomic(using=alias))
+            lock_image(name, alias)
+        if not any(
+            Recipe.objects.using(alias).filter(image=name).exists()
+            for alias in settings.DATABASE_SHARDS
+        ):
+            Recipe._meta.get_field('image').storage.delete(name)
+
+
+class RecipeStatsManager(models.Manager):
+    """Manager for the materialized per-user recipe statistics"""
+
+    def compute(self, user):
+        """Aggregates the statistics of a user straight from the recipes"""
+        aggregates = {
+            'recipe_count': Count('id'),
+            'time_minutes_total': Sum('time_minutes'),
+            'price_total': Sum('price'),
+        }
+        for name, lower, upper in RECIPE_PRICE_BUCKETS:
+            bucket = Q()
+            if lower is not None:
+                bucket &= Q(price__gte=lower)
+            if upper is not None:
+                bucket &= Q(price__lt=upper)
+            aggregates[name] = Count('id', filter=bucket)
+
+        stats = Recipe.objects.filter(user=user).aggregate(**aggregates)
+        stats['time_minutes_total'] = stats['time_minutes_total'] or 0
+        stats['price_total'] = stats['price_total'] or 0
+        return self.model(user=user, **stats)
+
+    def refresh(self, user):
+        """Recomputes and stores the statistics of a user"""
+        stats = self.compute(user)
+        stats.save()
+        return stats
+
+    def apply(self, user_id, time_minutes, price, sign=1):
+        """Adds (or removes, with sign=-1) one recipe to the user summary"""
+        price = Decimal(str(price))
+        bucket = recipe_price_bucket(price)
+        return self.filter(user_id=user_id).update(**{
+            'recipe_count': F('recipe_count') + sign,
+            'time_minutes_total': (
+                F('time_minutes_total') + sign * time_minutes
+            ),
+            'price_total': F('price_total') + sign * price,
+            bucket: F(bucket) + sign,
+        })
+
+
+class RecipeStats(models.Model):
+    """Materialized summary of the recipes of a user"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        primary_key=True,
+    )
+    recipe_count = models.IntegerField(default=0)
+    time_minutes_total = models.BigIntegerField(default=0)
+    price_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    price_under_5 = models.IntegerField(default=0)
+    price_5_to_10 = models.IntegerField(default=0)
+    price_10_to_20 = models.IntegerField(default=0)
+    price_20_to_50 = models.IntegerField(default=0)
+    price_over_50 = models.IntegerField(default=0)
+
+    objects = RecipeStatsManager()
+
+    def __str__(self):
+        return str(self.user)
+
+
+class Tombstone(models.Model):
+    """Trace of a deleted recipe, tag or ingredient for delta syncs"""
+    # No constraint so deleting the user itself can still leave tombstones
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+    model = models.CharField(max_length=32)
+    object_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'deleted_at'])]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
+
+
+class ImageUpload(models.Model):
+    """Recipe image being received in chunks by a resumable upload
+
+    The bytes live in a partial file under RECIPE_UPLOAD_TEMP_DIR, whose
+    size is the offset the next chunk must start at.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='+',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.filename
+
+    @property
+    def path(self):
+        return os.path.join(settings.RECIPE_UPLOAD_TEMP_DIR, f'{self.pk}.part')
+
+
+class IngredientPairManager(models.Manager):
+    """Manager for the materialized ingredient co-occurrence counts"""
+
+    def rebuild(self, user_ids=None):
+        """Recomputes the pairs of some users, or everyone, in bulk SQL"""
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        through = connection.ops.quote_name(
+            Recipe.ingredients.through._meta.db_table
+        )
+        recipe = connection.ops.quote_name(Recipe._meta.db_table)
+        where, params = '', []
+        if user_ids is not None:
+            where, params = 'WHERE r.user_id = ANY(%s)', [list(user_ids)]
+
+        queryset = self.get_queryset()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        queryset.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(user_id, ingredient_id, other_id, count) '
+                f'SELECT r.user_id, a.ingredient_id, b.ingredient_id, '
+                f'COUNT(*) FROM {through} a '
+                f'JOIN {through} b ON b.recipe_id = a.recipe_id '
+                f'AND b.ingredient_id <> a.ingredient_id '
+                f'JOIN {recipe} r ON r.id = a.recipe_id {where} '
+                f'GROUP BY r.user_id, a.ingredient_id, b.ingredient_id',
+                params
+            )
+            return cursor.rowcount
+
+    def apply(self, user_id, changed, others=(), sign=1):
+        """Adds (or removes, with sign=-1) ingredients to one recipe
+
+        `changed` are the ingredients added or removed, and `others` the
+        ingredients the recipe keeps. Both orders of every pair are stored
+        so a lookup only needs one index range.
+        """
+        deltas = Counter()
+        for pair in permutations(set(changed), 2):
+            deltas[pair] += sign
+        for ingredient in set(changed):
+            for other in set(others) - {ingredient}:
+                deltas[ingredient, other] += sign
+                deltas[other, ingredient] += sign
+        if not deltas:
+            return
+
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        values = ', '.join(['(%s, %s, %s, %s)'] * len(deltas))
+        params = []
+        for (ingredient, other), delta in deltas.items():
+            params += [user_id, ingredient, other, delta]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(user_id, ingredient_id, other_id, count) '
+                f'VALUES {values} '
+                f'ON CONFLICT (user_id, ingredient_id, other_id) '
+                f'DO UPDATE SET count = {table}.count + EXCLUDED.count',
+                params
+            )
+        if sign < 0:
+            self.filter(user_id=user_id, count__lte=0).delete()
+
+
+class IngredientPair(models.Model):
+    """Number of recipes of a user using two ingredients together"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='+',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    other = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    # Signed so a delta applied out of order cannot break a constraint
+    count = models.IntegerField(default=0)
+
+    objects = IngredientPairManager()
+
+    class Meta:
+        unique_together = (('user', 'ingredient', 'other'),)
+        indexes = [models.Index(fields=['user', 'ingredient', '-count'])]
+
+    def __str__(self):
+        return f'{self.ingredient_id} with {self.other_id}'
+
+
+# Advisory lock class held by the worker queueing the periodic jobs
+JOB_SCHEDULE_LOCK = 4046
+
+
+class JobManager(models.Manager):
+    """Manager for the background job queue"""
+
+    def claim(self, worker):
+        """Takes the next due job, skipping the ones other workers locked"""
+        with transaction.atomic():
+            job = self.select_for_update(skip_locked=True).filter(
+                status=Job.QUEUED,
+                run_at__lte=timezone.now(),
+            ).order_by('run_at', 'id').first()
+            if job is None:
+                return None
+
+            job.status = Job.RUNNING
+            job.attempts += 1
+            job.started_at = timezone.now()
+            job.locked_by = worker
+            job.save(update_fields=[
+                'status', 'attempts', 'started_at', 'locked_by'
+            ])
+            return job
+
+    def requeue_stale(self):
+        """Gives back the jobs of workers that died while running them
+
+        Jobs out of attempts are failed instead, so a job crashing its
+        worker cannot loop forever.
+        """
+        stale = self.filter(
+            status=Job.RUNNING,
+            started_at__lt=timezone.now() - timedelta(
+                seconds=settings.JOB_TIMEOUT
+            ),
+        )
+        failed = stale.filter(attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED,
+            finished_at=timezone.now(),
+            last_error='Worker lost while running the job',
+        )
+        return failed + stale.update(status=Job.QUEUED, locked_by='')
+
+    def schedule(self, periodic):
+        """Queues the periodic tasks not queued within their interval
+
+        `periodic` maps task names to intervals in seconds. Tasks with a
+        job still queued or running are skipped, and only one worker at a
+        time queues, so concurrent workers never queue a task twice.
+        """
+        queued = []
+        with transaction.atomic(using=self.db):
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_try_advisory_xact_lock(%s)',
+                    [JOB_SCHEDULE_LOCK]
+                )
+                if not cursor.fetchone()[0]:
+                    return queued
+
+            for name, interval in periodic.items():
+                if self.filter(
+                    Q(status__in=(Job.QUEUED, Job.RUNNING)) |
+                    Q(created_at__gt=timezone.now() - timedelta(
+                        seconds=interval
+                    )),
+                    task=name,
+                ).exists():
+                    continue
+                queued.append(self.create(
+                    task=name, max_attempts=settings.JOB_MAX_ATTEMPTS
+                ))
+
+        return queued
+
+    def prune(self):
+        """Deletes the finished jobs older than JOB_KEEP_DAYS"""
+        return self.filter(
+            status=Job.DONE,
+            finished_at__lt=timezone.now() - timedelta(
+                days=settings.JOB_KEEP_DAYS
+            ),
+        ).delete()[0]
+
+
+class Job(models.Model):
+    """Unit of background work run by the run_workers command"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    task = models.CharField(max_length=255)
+    payload = JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+
+    objects = JobManager()
+
+    class Meta:
+        indexes = [
+            # Serves the claim query of the workers
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['status', 'finished_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk}'
+
+
+class IdempotencyKey(models.Model):
+    """First response to a request sent with an Idempotency-Key header"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='+',
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = JSONField(encoder=DjangoJSONEncoder, null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = (('user', 'key'),)
+
+    def __str__(self):
+        return self.key
+
+
+class RateBucketManager(models.Manager):
+    """Manager for the token buckets shared by the API throttles"""
+
+    def take(self, key, rate, capacity):
+        """Takes a token from a bucket refilled at `rate` tokens a second
+
+        The refill and the take are one upsert, so concurrent requests from
+        any number of processes see a consistent count. Returns None when a
+        token was taken, or else the seconds until the next one is due.
+        """
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        refilled = (
+            'LEAST(%(capacity)s, b.tokens + %(rate)s * GREATEST(0, '
+            'EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at)))'
+        )
+        params = {'key': key, 'rate': rate, 'capacity': capacity}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} AS b (key, tokens, updated_at) '
+                f'VALUES (%(key)s, %(capacity)s - 1, clock_timestamp()) '
+                f'ON CONFLICT (key) DO UPDATE SET '
+                f'tokens = {refilled} - 1, updated_at = clock_timestamp() '
+                f'WHERE {refilled} >= 1 RETURNING tokens',
+                params
+            )
+            if cursor.fetchone() is not None:
+                return None
+
+            cursor.execute(
+                f'SELECT {refilled} FROM {table} b WHERE b.key = %(key)s',
+                params
+            )
+            row = cursor.fetchone()
+        return (1 - row[0]) / rate if row else 0
+
+    def prune(self):
+        """Deletes the buckets idle long enough to be full again"""
+        return self.filter(
+            updated_at__lt=timezone.now() - timedelta(days=1)
+        ).delete()
+
+
+class RateBucket(models.Model):
+    """Tokens left to a client in one throttle scope
+
+    The table is unlogged: buckets are cheap to lose on a crash and skip
+    the write-ahead log on every request.
+    """
+    key = models.CharField(max_length=255, primary_key=True)
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    objects = RateBucketManager()
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,104 @@
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+
+from core.deletion import purge_user_data
+from core.models import Tag, Ingredient, Recipe, RecipeStats, Tombstone, \
+                        ImageUpload, IngredientPair, IdempotencyKey
+from core.sharding import move_lock, shard_for, use_shard
+
+# Sharded tables in dependency order, as (model, user lookup, keep ids).
+# Ids clients see are kept, the others are drawn again on the target.
+MOVED_MODELS = (
+    (Tag, 'user_id', True),
+    (Ingredient, 'user_id', True),
+    (Recipe, 'user_id', True),
+    (Recipe.tags.through, 'recipe__user_id', False),
+    (Recipe.ingredients.through, 'recipe__user_id', False),
+    (IngredientPair, 'user_id', False),
+    (RecipeStats, 'user_id', True),
+    (Tombstone, 'user_id', True),
+    (ImageUpload, 'user_id', True),
+    (IdempotencyKey, 'user_id', False),
+)
+
+
+def _copy_rows(queryset, target, keep_ids, chunk_size):
+    """Copies the rows of a queryset as they are into another database
+
+    Rows go through multi-row INSERTs rather than bulk_create, which would
+    stamp the auto_now fields sync cursors and expiries rely on.
+    """
+    model = queryset.model
+    connection = connections[target]
+    fields = [
+        field for field in model._meta.concrete_fields
+        if keep_ids or not field.primary_key
+    ]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(
+        connection.ops.quote_name(field.column) for field in fields
+    )
+    placeholder = f'({", ".join(["%s"] * len(fields))})'
+    rows = queryset.values_list(
+        *[field.attname for field in fields]
+    ).iterator(chunk_size=chunk_size)
+
+    copied = 0
+    with connection.cursor() as cursor:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return copied
+            params = [
+                field.get_db_prep_save(value, connection)
+                for row in chunk
+                for field, value in zip(fields, row)
+            ]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'VALUES {", ".join([placeholder] * len(chunk))}',
+                params
+            )
+            copied += len(chunk)
+
+
+def move_user(user, target, chunk_size=1000):
+    """Moves the recipe data of a user to another shard while it is live
+
+    Writes of the user wait on the move lock while the rows are copied in
+    one transaction on the target and the directory is switched over, and
+    reads keep being served by the source until then. The copies left on
+    other shards are deleted afterwards, which also finishes a move
+    interrupted before. Returns the number of rows copied per table.
+    """
+    report = Counter()
+    with move_lock(user.pk):
+        user.shard = get_user_model().objects.filter(
+            pk=user.pk
+        ).values_list('shard', flat=True).get()
+        source = shard_for(user)
+        if source != target:
+            with transaction.atomic(using=target):
+                with use_shard(target):
+                    purge_user_data(user.pk, chunk_size)
+                for model, lookup, keep_ids in MOVED_MODELS:
+                    queryset = model.objects.using(source).filter(
+                        **{lookup: user.pk}
+                    )
+                    report[model._meta.db_table] += _copy_rows(
+                        queryset, target, keep_ids, chunk_size
+                    )
+
+            get_user_model().objects.filter(pk=user.pk).update(shard=target)
+            user.shard = target
+
+    for alias in settings.DATABASE_SHARDS:
+        if alias != target:
+            with use_shard(alias):
+                purge_user_data(user.pk, chunk_size)
+
+    return {table: count for table, count in report.items() if count}
@@ -0,0 +1,152 @@
+import threading
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Models whose rows live on the shard of their user; everything else (users,
+# tokens, jobs, throttles) stays in the directory, the default database
+SHARDED_MODELS = {
+    'core.tag', 'core.ingredient', 'core.recipe', 'core.recipe_tags',
+    'core.recipe_ingredients', 'core.recipestats', 'core.tombstone',
+    'core.imageupload', 'core.ingredientpair', 'core.idempotencykey',
+}
+
+# Advisory lock class of the per-user lock writes share and moves take
+MOVE_LOCK = 4049
+
+_local = threading.local()
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def place_user(user_id):
+    """Returns the shard a new user is placed on"""
+    shards = settings.DATABASE_SHARDS
+    return shards[user_id % len(shards)]
+
+
+def shard_for(user):
+    """Returns the shard holding the recipe data of a user
+
+    Users without a shard predate sharding and live on the first one.
+    """
+    return user.shard or settings.DATABASE_SHARDS[0]
+
+
+def current_shard():
+    """Returns the shard sharded queries are routed to, if one is set"""
+    return getattr(_local, 'shard', None)
+
+
+@contextmanager
+def use_shard(alias):
+    """Routes the sharded queries of the block to one shard"""
+    previous = current_shard()
+    _local.shard = alias
+    try:
+        yield alias
+    finally:
+        _local.shard = previous
+
+
+def each_shard():
+    """Yields every shard, with sharded queries routed to it meanwhile"""
+    for alias in settings.DATABASE_SHARDS:
+        with use_shard(alias):
+            yield alias
+
+
+@contextmanager
+def move_lock(user_id, shared=False):
+    """Holds the directory lock guarding the shard of a user
+
+    Writes hold it shared for their whole request and a move holds it
+    exclusively, so a user is never written to while being copied.
+    """
+    suffix = '_shared' if shared else ''
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute(
+            f'SELECT pg_advisory_lock{suffix}(%s, %s)', [MOVE_LOCK, user_id]
+        )
+        try:
+            yield
+        finally:
+            cursor.execute(
+                f'SELECT pg_advisory_unlock{suffix}(%s, %s)',
+                [MOVE_LOCK, user_id]
+            )
+
+
+@contextmanager
+def user_shard(user, write=False):
+    """Routes the block to the shard of a user
+
+    With several shards, writes wait for a move of the user in progress
+    and then read its shard again, since the move may have changed it.
+    """
+    if not write or len(settings.DATABASE_SHARDS) == 1:
+        with use_shard(shard_for(user)):
+            yield
+        return
+
+    with move_lock(user.pk, shared=True):
+        user.shard = get_user_model().objects.filter(
+            pk=user.pk
+        ).values_list('shard', flat=True).get()
+        with use_shard(shard_for(user)):
+            yield
+
+
+class UserShardMixin:
+    """Routes the requests of an API view to the shard of their user"""
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self.shard_stack:
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            self.shard_stack.enter_context(user_shard(
+                request.user, write=request.method not in SAFE_METHODS
+            ))
+
+
+class ShardRouter:
+    """Routes the sharded models to the shard of their user
+
+    The shard is taken from the instance a query is made for when there is
+    one, or else from the enclosing `use_shard` block. Every database gets
+    the full schema.
+    """
+
+    def _db(self, model, **hints):
+        if not is_sharded(model):
+            return None
+
+        instance = hints.get('instance')
+        if isinstance(instance, get_user_model()):
+            return shard_for(instance)
+        if instance is not None:
+            if instance._state.db is not None:
+                return instance._state.db
+            user = instance._state.fields_cache.get('user')
+            if user is not None:
+                return shard_for(user)
+
+        return current_shard()
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        user_model = get_user_model()
+        for obj, other in ((obj1, obj2), (obj2, obj1)):
+            if isinstance(obj, user_model) and is_sharded(type(other)):
+                return True
+        return None
@@ -0,0 +1,199 @@
+import os
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, pre_delete, post_delete, \
+                                     post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Tag, Ingredient, Recipe, RecipeStats, Tombstone, \
+                        ImageUpload, IngredientPair, release_recipe_image
+
+
+def _attr_changed(model, field_name):
+    """Builds an m2m_changed receiver for a recipe attribute relation"""
+
+    def handler(sender, instance, action, reverse, pk_set, **kwargs):
+        if action == 'pre_clear':
+            related = instance.recipe_set if reverse else \
+                getattr(instance, field_name)
+            instance._cleared_pks = set(related.values_list('pk', flat=True))
+            return
+        elif action == 'post_clear':
+            pk_set = instance.__dict__.pop('_cleared_pks', set())
+        elif action not in ('post_add', 'post_remove'):
+            return
+
+        if reverse:
+            attr_pks, recipe_pks = [instance.pk], pk_set
+        else:
+            attr_pks, recipe_pks = pk_set, [instance.pk]
+
+        if attr_pks and recipe_pks:
+            model.objects.refresh_recipe_count(attr_pks)
+            Recipe.objects.refresh_attr_counts(recipe_pks)
+            Recipe.objects.filter(pk__in=recipe_pks).update(
+                updated_at=timezone.now(),
+                revision=F('revision') + 1,
+            )
+
+    return handler
+
+
+tags_changed = _attr_changed(Tag, 'tags')
+ingredients_changed = _attr_changed(Ingredient, 'ingredients')
+m2m_changed.connect(tags_changed, sender=Recipe.tags.through)
+m2m_changed.connect(ingredients_changed, sender=Recipe.ingredients.through)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def ingredient_pairs_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Keeps the ingredient co-occurrence counts in step with recipes"""
+    if action in ('pre_remove', 'pre_clear'):
+        # Only links that actually exist are removed from the counts
+        related = instance.recipe_set if reverse else instance.ingredients
+        if pk_set is not None:
+            related = related.filter(pk__in=pk_set)
+        instance._pair_pks = set(related.values_list('pk', flat=True))
+        return
+    elif action == 'post_add':
+        sign, changed = 1, pk_set
+    elif action in ('post_remove', 'post_clear'):
+        sign, changed = -1, instance.__dict__.pop('_pair_pks', set())
+    else:
+        return
+
+    if not changed:
+        return
+    if not reverse:
+        others = set(
+            instance.ingredients.values_list('pk', flat=True)
+        ) - set(changed)
+        IngredientPair.objects.apply(instance.user_id, changed, others, sign)
+        return
+
+    recipes = {}
+    for recipe_pk, user_id, ingredient_pk in sender.objects.filter(
+        recipe_id__in=changed
+    ).exclude(ingredient_id=instance.pk).values_list(
+        'recipe_id', 'recipe__user_id', 'ingredient_id'
+    ):
+        recipes.setdefault((recipe_pk, user_id), []).append(ingredient_pk)
+    for (recipe_pk, user_id), others in recipes.items():
+        IngredientPair.objects.apply(user_id, [instance.pk], others, sign)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_pre_delete(sender, instance, **kwargs):
+    """Remembers the attributes of a recipe before its rows go away"""
+    instance._attr_pks = {
+        Tag: list(instance.tags.values_list('pk', flat=True)),
+        Ingredient: list(instance.ingredients.values_list('pk', flat=True)),
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_post_delete(sender, instance, **kwargs):
+    """Refreshes the counters of attributes used by a deleted recipe"""
+    attr_pks = instance.__dict__.pop('_attr_pks', {})
+    for model, pks in attr_pks.items():
+        if pks:
+            model.objects.refresh_recipe_count(pks)
+    IngredientPair.objects.apply(
+        instance.user_id, attr_pks.get(Ingredient, ()), sign=-1
+    )
+
+    if settings.RECIPE_STATS_MATERIALIZED:
+        RecipeStats.objects.apply(
+            instance.user_id, instance.time_minutes, instance.price, sign=-1
+        )
+
+    if instance.image:
+        transaction.on_commit(
+            partial(release_recipe_image, instance.image.name),
+            using=kwargs['using']
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_post_save(sender, instance, created, **kwargs):
+    """Applies the change of a recipe to the materialized statistics"""
+    if not settings.RECIPE_STATS_MATERIALIZED:
+        return
+
+    loaded = getattr(instance, '_loaded_values', {})
+    if not created:
+        if not {'user_id', 'time_minutes', 'price'} <= loaded.keys():
+            return
+        RecipeStats.objects.apply(
+            loaded['user_id'], loaded['time_minutes'], loaded['price'],
+            sign=-1,
+        )
+
+    RecipeStats.objects.apply(
+        instance.user_id, instance.time_minutes, instance.price
+    )
+    loaded.update(
+        user_id=instance.user_id,
+        time_minutes=instance.time_minutes,
+        price=instance.price,
+    )
+    instance._loaded_values = loaded
+
+
+@receiver(post_save, sender=Recipe)
+def release_replaced_image(sender, instance, **kwargs):
+    """Releases the previous image file of a recipe when it changes"""
+    loaded = getattr(instance, '_loaded_values', {})
+    previous = loaded.get('image')
+    if previous and previous != instance.image.name:
+        transaction.on_commit(
+            partial(release_recipe_image, previous), using=kwargs['using']
+        )
+
+    loaded['image'] = instance.image.name
+    instance._loaded_values = loaded
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def attr_pre_delete(sender, instance, **kwargs):
+    """Marks the recipes using a deleted tag or ingredient as changed"""
+    model_name = sender._meta.model_name
+    Recipe.objects.filter(**{f'{model_name}s': instance}).update(**{
+        f'{model_name}_count': F(f'{model_name}_count') - 1,
+        'updated_at': timezone.now(),
+        'revision': F('revision') + 1,
+    })
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def leave_tombstone(sender, instance, **kwargs):
+    """Records the deletion so delta syncs can report it"""
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        model=sender._meta.model_name,
+        object_id=instance.pk,
+    )
+
+
+def _remove_partial_upload(path):
+    """Deletes the partial file of an upload if it is still around"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@receiver(post_delete, sender=ImageUpload)
+def remove_partial_upload(sender, instance, **kwargs):
+    """Removes the partial file of a finished or abandoned upload"""
+    transaction.on_commit(
+        partial(_remove_partial_upload, instance.path), using=kwargs['using']
+    )
@@ -0,0 +1,46 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage naming every file after the SHA-256 of its content
+
+    Identical uploads map to the same name and skip the write entirely,
+    only touching the file so it looks as recent as a new one. The same
+    file can then be referenced by many rows, so callers must only delete
+    it once nothing references it anymore.
+    """
+
+    def digest(self, content):
+        """Hashes a file chunk by chunk without loading it in memory"""
+        sha = hashlib.sha256()
+        for chunk in content.chunks():
+            sha.update(chunk)
+
+        return sha.hexdigest()
+
+    def content_name(self, name, content):
+        """Returns the name a file is stored under, from its content"""
+        digest = self.digest(content)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], f'{digest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.content_name(name, content)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+
+        return self._save(name, content)
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from core.jobs import task
+from core.models import IngredientPair, IdempotencyKey, RateBucket
+from core.sharding import each_shard
+
+
+@task
+def repair_recipe_counts():
+    """Recomputes the denormalized recipe counters"""
+    call_command('repair_recipe_counts')
+
+
+@task
+def build_ingredient_pairs(user_ids=None):
+    """Rebuilds the ingredient co-occurrence counts of some users"""
+    for alias in each_shard():
+        with transaction.atomic(using=alias):
+            IngredientPair.objects.rebuild(user_ids)
+
+
+@task
+def prune_idempotency_keys():
+    """Deletes the idempotency keys older than their TTL"""
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    for alias in settings.DATABASE_SHARDS:
+        IdempotencyKey.objects.using(alias).filter(
+            created_at__lt=cutoff
+        ).delete()
+
+
+@task
+def prune_rate_buckets():
+    """Deletes the throttle buckets nobody has drawn from lately"""
+    RateBucket.objects.prune()
@@ -1,7 +1,12 @@
+from unittest.mock import patch
+
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from core import models
+from core.admin import EstimatedCountPaginator
+
 
 class AdminSiteTests(TestCase):
 
@@ -40,3 +45,64 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def test_recipe_admin_pages(self):
+        """Tests the recipe changelist, search and change page"""
+        recipe = models.Recipe.objects.create(
+            user=self.user, title='Pumpkin soup', time_minutes=5, price=5.00
+        )
+        recipe.tags.add(models.Tag.objects.create(user=self.user, name='Fall'))
+
+        res = self.client.get(reverse('admin:core_recipe_changelist'))
+        self.assertContains(res, recipe.title)
+        res = self.client.get(
+            reverse('admin:core_recipe_changelist'), {'q': 'pump'}
+        )
+        self.assertContains(res, recipe.title)
+        res = self.client.get(
+            reverse('admin:core_recipe_change', args=[recipe.id])
+        )
+        self.assertEqual(res.status_code, 200)
+
+    def test_tag_autocomplete(self):
+        """Tests the tag search used by the recipe autocomplete widget"""
+        models.Tag.objects.create(user=self.user, name='Vegan')
+        models.Tag.objects.create(user=self.user, name='Dessert')
+        res = self.client.get(reverse('admin:core_tag_autocomplete'), {
+            'term': 've'
+        })
+
+        self.assertContains(res, 'Vegan')
+        self.assertNotContains(res, 'Dessert')
+
+    def test_estimated_count_paginator(self):
+        """Tests that only big unfiltered lists use the row estimate"""
+        models.Tag.objects.create(user=self.user, name='Vegan')
+        with patch.object(
+            EstimatedCountPaginator, '_estimated_count', return_value=50000
+        ):
+            paginator = EstimatedCountPaginator(models.Tag.objects.all(), 100)
+            self.assertEqual(paginator.count, 50000)
+            paginator = EstimatedCountPaginator(
+                models.Tag.objects.filter(name='Vegan'), 100
+            )
+            self.assertEqual(paginator.count, 1)
+
+        paginator = EstimatedCountPaginator(models.Tag.objects.all(), 100)
+        self.assertEqual(paginator.count, 1)
+
+    def test_delete_user_from_admin(self):
+        """Tests deleting a user with recipes through the admin"""
+        models.Recipe.objects.create(
+            user=self.user, title='Pumpkin soup', time_minutes=5, price=5.00
+        )
+        url = reverse('admin:core_user_delete', args=[self.user.id])
+        res = self.client.get(url)
+        self.assertContains(res, 'Recipes: 1')
+
+        res = self.client.post(url, {'post': 'yes'})
+        self.assertEqual(res.status_code, 302)
+        self.assertFalse(models.Recipe.objects.exists())
+        self.assertFalse(
+            get_user_model().objects.filter(pk=self.user.pk).exists()
+        )
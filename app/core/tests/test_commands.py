@@ -1,8 +1,18 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
 from unittest.mock import patch
 
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Tag, Ingredient, Recipe, Tombstone, IngredientPair
 
 
 class CommandTests(TestCase):
@@ -21,3 +31,129 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+    def test_repair_recipe_counts(self):
+        """Test recomputing drifted recipe counters"""
+        user = get_user_model().objects.create_user('test@test.com', 'test')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=user, title='Salad', time_minutes=5, price=5.00
+        )
+        recipe.tags.add(tag)
+        Tag.objects.update(recipe_count=42)
+        call_command('repair_recipe_counts', stdout=StringIO())
+        tag.refresh_from_db()
+
+        self.assertEqual(tag.recipe_count, 1)
+
+    def test_build_ingredient_pairs(self):
+        """Test rebuilding the ingredient co-occurrence counts"""
+        user = get_user_model().objects.create_user('test@test.com', 'test')
+        salt = Ingredient.objects.create(user=user, name='Salt')
+        pepper = Ingredient.objects.create(user=user, name='Pepper')
+        for title in ('Soup', 'Stew'):
+            recipe = Recipe.objects.create(
+                user=user, title=title, time_minutes=5, price=5.00
+            )
+            recipe.ingredients.add(salt, pepper)
+        IngredientPair.objects.all().delete()
+        call_command('build_ingredient_pairs', stdout=StringIO())
+
+        pair = IngredientPair.objects.get(ingredient=salt, other=pepper)
+        self.assertEqual(pair.count, 2)
+        self.assertEqual(IngredientPair.objects.count(), 2)
+
+    def test_purge_users(self):
+        """Test deleting users and their data with the purge command"""
+        user = get_user_model().objects.create_user('test@test.com', 'test')
+        other = get_user_model().objects.create_user('other@test.com', 'x')
+        Token.objects.create(user=user)
+        tag = Tag.objects.create(user=user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=user, name='Salt')
+        for title in ('Salad', 'Soup', 'Stew'):
+            recipe = Recipe.objects.create(
+                user=user, title=title, time_minutes=5, price=5.00
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+        others_recipe = Recipe.objects.create(
+            user=other, title='Curry', time_minutes=5, price=5.00
+        )
+        others_recipe.tags.add(tag)
+
+        out = StringIO()
+        call_command('purge_users', user.email, '--chunk-size=2', stdout=out)
+
+        self.assertFalse(get_user_model().objects.filter(pk=user.pk).exists())
+        self.assertFalse(Recipe.objects.filter(user=user).exists())
+        self.assertFalse(Tag.objects.exists())
+        self.assertFalse(Ingredient.objects.exists())
+        self.assertFalse(Token.objects.exists())
+        self.assertFalse(Tombstone.objects.exists())
+        self.assertEqual(list(others_recipe.tags.all()), [])
+        self.assertIn('core_recipe: 3', out.getvalue())
+        self.assertIn('core_recipe_tags: 4', out.getvalue())
+
+    def test_gc_media(self):
+        """Test removing unreferenced recipe images after a grace period"""
+        user = get_user_model().objects.create_user('test@test.com', 'test')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        image_dir = os.path.join(media_root, 'uploads', 'recipe', 'ab')
+        os.makedirs(image_dir)
+        paths = {}
+        for name in ('kept', 'old', 'young'):
+            paths[name] = os.path.join(image_dir, f'{name}.jpg')
+            with open(paths[name], 'wb') as image_file:
+                image_file.write(b'image')
+        week_ago = time.time() - 7 * 24 * 3600
+        for name in ('kept', 'old'):
+            os.utime(paths[name], (week_ago, week_ago))
+        Recipe.objects.create(
+            user=user, title='Salad', time_minutes=5, price=5.00,
+            image='uploads/recipe/ab/kept.jpg'
+        )
+
+        with override_settings(MEDIA_ROOT=media_root):
+            out = StringIO()
+            call_command('gc_media', '--dry-run', stdout=out)
+            self.assertTrue(os.path.exists(paths['old']))
+            self.assertIn('1 orphans would be deleted', out.getvalue())
+
+            quarantine = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, quarantine)
+            call_command('gc_media', quarantine=quarantine, stdout=StringIO())
+
+        self.assertTrue(os.path.exists(paths['kept']))
+        self.assertTrue(os.path.exists(paths['young']))
+        self.assertFalse(os.path.exists(paths['old']))
+        self.assertTrue(os.path.exists(
+            os.path.join(quarantine, 'uploads/recipe/ab/old.jpg')
+        ))
+
+    def test_gc_media_rechecks_references(self):
+        """Test keeping orphans referenced since the references loaded"""
+        user = get_user_model().objects.create_user('test@test.com', 'test')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        image_dir = os.path.join(media_root, 'uploads', 'recipe', 'ab')
+        os.makedirs(image_dir)
+        path = os.path.join(image_dir, 'reused.jpg')
+        with open(path, 'wb') as image_file:
+            image_file.write(b'image')
+        week_ago = time.time() - 7 * 24 * 3600
+        os.utime(path, (week_ago, week_ago))
+        Recipe.objects.create(
+            user=user, title='Salad', time_minutes=5, price=5.00,
+            image='uploads/recipe/ab/reused.jpg'
+        )
+
+        with override_settings(MEDIA_ROOT=media_root), patch(
+            'core.management.commands.gc_media.Command._referenced',
+            return_value=set()
+        ):
+            out = StringIO()
+            call_command('gc_media', stdout=out)
+
+        self.assertTrue(os.path.exists(path))
+        self.assertIn('0 orphans deleted', out.getvalue())
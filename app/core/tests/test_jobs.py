@@ -0,0 +1,141 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+calls = []
+
+
+@jobs.task
+def record(value):
+    calls.append(value)
+
+
+@jobs.task
+def explode():
+    raise RuntimeError('boom')
+
+
+class JobTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_run_job(self):
+        """Test running a claimed job"""
+        record.enqueue(value=42)
+        job = Job.objects.claim('test')
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(jobs.run_job(job), Job.DONE)
+
+        self.assertEqual(calls, [42])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_claim_due_jobs_only(self):
+        """Test that jobs are claimed once they are due, oldest first"""
+        jobs.enqueue(record, run_at=timezone.now() + timedelta(hours=1))
+        first = record.enqueue(value=1)
+        record.enqueue(value=2)
+
+        self.assertEqual(Job.objects.claim('test'), first)
+        self.assertEqual(Job.objects.claim('test').payload, {'value': 2})
+        self.assertIsNone(Job.objects.claim('test'))
+
+    @override_settings(JOB_RETRY_BACKOFF=10)
+    def test_failed_job_retried_with_backoff(self):
+        """Test that failures are retried later until out of attempts"""
+        explode.enqueue(max_attempts=2)
+        job = Job.objects.claim('test')
+        self.assertEqual(jobs.run_job(job), Job.QUEUED)
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=4))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        job = Job.objects.claim('test')
+        self.assertEqual(jobs.run_job(job), Job.FAILED)
+
+    def test_retry_delay_grows(self):
+        """Test that the retry delay doubles up to its maximum"""
+        with override_settings(JOB_RETRY_BACKOFF=10, JOB_RETRY_BACKOFF_MAX=60):
+            self.assertLessEqual(jobs.retry_delay(1).total_seconds(), 10)
+            self.assertGreaterEqual(jobs.retry_delay(3).total_seconds(), 20)
+            self.assertLessEqual(jobs.retry_delay(10).total_seconds(), 60)
+
+    @override_settings(JOB_TIMEOUT=60)
+    def test_requeue_stale(self):
+        """Test that jobs of lost workers are queued again or failed"""
+        lost = record.enqueue(value=1)
+        poison = record.enqueue(value=2, max_attempts=1)
+        Job.objects.update(
+            status=Job.RUNNING,
+            attempts=1,
+            started_at=timezone.now() - timedelta(minutes=5)
+        )
+        Job.objects.requeue_stale()
+
+        lost.refresh_from_db()
+        poison.refresh_from_db()
+        self.assertEqual(lost.status, Job.QUEUED)
+        self.assertEqual(poison.status, Job.FAILED)
+
+    def test_schedule_periodic_tasks(self):
+        """Test that periodic tasks are queued once per interval"""
+        periodic = {record.task_name: 3600}
+        self.assertEqual(len(Job.objects.schedule(periodic)), 1)
+        self.assertEqual(Job.objects.schedule(periodic), [])
+
+        Job.objects.update(status=Job.DONE)
+        self.assertEqual(Job.objects.schedule(periodic), [])
+        Job.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(len(Job.objects.schedule(periodic)), 1)
+
+
+class JobWorkerTests(TransactionTestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_skips_locked_jobs(self):
+        """Test that a job locked by one worker is skipped by others"""
+        locked = record.enqueue(value=1)
+        free = record.enqueue(value=2)
+        holding = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with transaction.atomic():
+                list(Job.objects.select_for_update().filter(pk=locked.pk))
+                holding.set()
+                release.wait(5)
+            connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        holding.wait(5)
+        try:
+            self.assertEqual(Job.objects.claim('test'), free)
+            self.assertIsNone(Job.objects.claim('test'))
+        finally:
+            release.set()
+            thread.join()
+
+    @override_settings(JOB_SCHEDULE={})
+    def test_run_workers_burst(self):
+        """Test that run_workers drains the due jobs"""
+        for value in range(3):
+            record.enqueue(value=value)
+        out = StringIO()
+        call_command('run_workers', '--burst', stdout=out)
+
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertIn('Ran 3 jobs', out.getvalue())
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
@@ -81,3 +81,42 @@ class ModelTests(TestCase):
 
         exp_path = f'uploads/recipe/{uuid}.jpg'
         self.assertEqual(file_path, exp_path)
+
+    def test_recipe_count_follows_recipe_tags(self):
+        """Tests that tag recipe counters follow m2m changes"""
+        user = sample_user()
+        tag1 = models.Tag.objects.create(user=user, name='Vegan')
+        tag2 = models.Tag.objects.create(user=user, name='Dessert')
+        recipe = models.Recipe.objects.create(
+            user=user, title='Pie', time_minutes=5, price=5.00
+        )
+        recipe.tags.add(tag1, tag2)
+        tag1.refresh_from_db()
+        self.assertEqual(tag1.recipe_count, 1)
+
+        recipe.tags.remove(tag1)
+        tag1.refresh_from_db()
+        self.assertEqual(tag1.recipe_count, 0)
+
+        tag2.recipe_set.add(models.Recipe.objects.create(
+            user=user, title='Cake', time_minutes=5, price=5.00
+        ))
+        tag2.refresh_from_db()
+        self.assertEqual(tag2.recipe_count, 2)
+
+        recipe.tags.clear()
+        tag2.refresh_from_db()
+        self.assertEqual(tag2.recipe_count, 1)
+
+    def test_recipe_count_after_recipe_delete(self):
+        """Tests that deleting a recipe decrements ingredient counters"""
+        user = sample_user()
+        ingredient = models.Ingredient.objects.create(user=user, name='Salt')
+        recipe = models.Recipe.objects.create(
+            user=user, title='Fries', time_minutes=5, price=5.00
+        )
+        recipe.ingredients.add(ingredient)
+        recipe.delete()
+        ingredient.refresh_from_db()
+
+        self.assertEqual(ingredient.recipe_count, 0)
@@ -0,0 +1,170 @@
+import threading
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Recipe, IngredientPair
+from core.sharding import move_lock, use_shard
+from core.tasks import build_ingredient_pairs
+
+SHARD = 'shard1'
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class ShardingTests(TransactionTestCase):
+    """Tests routing recipe data over a second local database"""
+    multi_db = True
+
+    @classmethod
+    def setUpClass(cls):
+        cls.shards = override_settings(DATABASE_SHARDS=['default', SHARD])
+        cls.shards.enable()
+        settings.DATABASES[SHARD] = dict(
+            settings.DATABASES['default'], NAME=SHARD, TEST={}
+        )
+        connections[SHARD].creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[SHARD].creation.destroy_test_db(SHARD, verbosity=0)
+        del connections[SHARD]
+        del settings.DATABASES[SHARD]
+        cls.shards.disable()
+
+    def create_user(self, email, shard):
+        user = get_user_model().objects.create_user(email, 'pass123')
+        get_user_model().objects.filter(pk=user.pk).update(shard=shard)
+        user.shard = shard
+        return user
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_new_users_placed_by_id(self):
+        """Test that new users are spread over the shards by id"""
+        for email in ('a@test.com', 'b@test.com'):
+            user = get_user_model().objects.create_user(email, 'pass123')
+            user.refresh_from_db()
+            self.assertEqual(
+                user.shard, settings.DATABASE_SHARDS[user.pk % 2]
+            )
+
+    def test_requests_routed_to_user_shard(self):
+        """Test that the API reads and writes the shard of the user"""
+        user = self.create_user('test@test.com', SHARD)
+        other = self.create_user('other@test.com', 'default')
+        payload = {
+            'title': 'Soup', 'time_minutes': 5, 'price': '2.00',
+            'tags': [], 'ingredients': []
+        }
+        res = self.client_for(user).post(RECIPES_URL, payload, format='json')
+        self.client_for(other).post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertGreater(res.data['id'], 10 ** 8)
+        self.assertTrue(Recipe.objects.using(SHARD).filter(
+            pk=res.data['id'], user=user
+        ).exists())
+        self.assertFalse(
+            Recipe.objects.using('default').filter(user=user).exists()
+        )
+        res = self.client_for(user).get(RECIPES_URL)
+        self.assertEqual([recipe['title'] for recipe in res.data], ['Soup'])
+
+    def test_rebalance_user(self):
+        """Test moving a user and back without renumbering its data"""
+        user = self.create_user('test@test.com', 'default')
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=2
+        )
+        recipe.tags.add(Tag.objects.create(user=user, name='Vegan'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=user, name='Salt'),
+            Ingredient.objects.create(user=user, name='Leek'),
+        )
+        recipe.delete()
+        recipe = Recipe.objects.create(
+            user=user, title='Stew', time_minutes=50, price=8
+        )
+        recipe.tags.set(Tag.objects.filter(user=user))
+        updated_at = Recipe.objects.get(pk=recipe.pk).updated_at
+
+        out = StringIO()
+        call_command('rebalance_user', user.email, SHARD, stdout=out)
+
+        self.assertIn('core_tombstone: 1', out.getvalue())
+        user.refresh_from_db()
+        self.assertEqual(user.shard, SHARD)
+        for model in (Recipe, Tag, Ingredient):
+            self.assertFalse(model.objects.using('default').exists())
+        moved = Recipe.objects.using(SHARD).get(pk=recipe.pk)
+        self.assertEqual(moved.updated_at, updated_at)
+        self.assertEqual(moved.tag_count, 1)
+        res = self.client_for(user).get(RECIPES_URL)
+        self.assertEqual(res.data[0]['id'], recipe.pk)
+        self.assertEqual(len(res.data[0]['tags']), 1)
+
+        call_command('rebalance_user', str(user.pk), 'default', stdout=out)
+        self.assertFalse(Recipe.objects.using(SHARD).exists())
+        self.assertEqual(
+            Ingredient.objects.using('default').filter(user=user).count(), 2
+        )
+
+    def test_write_waits_for_move(self):
+        """Test that a write during a move lands on the new shard"""
+        user = self.create_user('test@test.com', 'default')
+        responses = []
+
+        def post():
+            responses.append(
+                self.client_for(user).post(TAGS_URL, {'name': 'Vegan'})
+            )
+            connection.close()
+
+        with move_lock(user.pk):
+            thread = threading.Thread(target=post)
+            thread.start()
+            time.sleep(0.3)
+            self.assertTrue(thread.is_alive())
+            get_user_model().objects.filter(pk=user.pk).update(shard=SHARD)
+        thread.join(5)
+
+        self.assertEqual(responses[0].status_code, status.HTTP_201_CREATED)
+        self.assertTrue(
+            Tag.objects.using(SHARD).filter(name='Vegan').exists()
+        )
+
+    def test_build_ingredient_pairs_task(self):
+        """Test that the pairs task rebuilds the users of every shard"""
+        user = self.create_user('test@test.com', SHARD)
+        with use_shard(SHARD):
+            recipe = Recipe.objects.create(
+                user=user, title='Soup', time_minutes=5, price=2
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=user, name='Salt'),
+                Ingredient.objects.create(user=user, name='Leek'),
+            )
+        IngredientPair.objects.using(SHARD).all().delete()
+
+        build_ingredient_pairs(user_ids=[user.pk])
+
+        self.assertEqual(
+            IngredientPair.objects.using(SHARD).filter(user=user).count(), 2
+        )
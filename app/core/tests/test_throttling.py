@@ -0,0 +1,132 @@
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import RateBucket
+from core.tasks import prune_rate_buckets
+from core.throttling import TokenBucketThrottle
+
+TAGS_URL = reverse('recipe:tag-list')
+TOKEN_URL = reverse('user:token')
+
+RATES = {'read': '2/min', 'write': '1/min', 'upload': '1/min',
+         'login': '1/min'}
+
+
+class RateBucketTests(TestCase):
+
+    def test_take_until_empty(self):
+        """Test that a bucket allows its capacity, then reports the wait"""
+        for _ in range(3):
+            self.assertIsNone(RateBucket.objects.take('k', 1, 3))
+
+        wait = RateBucket.objects.take('k', 1, 3)
+        self.assertGreater(wait, 0.9)
+        self.assertLessEqual(wait, 1)
+        self.assertAlmostEqual(
+            RateBucket.objects.get(key='k').tokens, 0, places=2
+        )
+
+    def test_refill_up_to_capacity(self):
+        """Test that tokens come back with time without exceeding capacity"""
+        RateBucket.objects.take('k', 1, 3)
+        RateBucket.objects.filter(key='k').update(
+            tokens=0, updated_at=timezone.now() - timedelta(hours=1)
+        )
+        for _ in range(3):
+            self.assertIsNone(RateBucket.objects.take('k', 1, 3))
+        self.assertIsNotNone(RateBucket.objects.take('k', 1, 3))
+
+    def test_prune(self):
+        """Test that idle buckets are deleted"""
+        RateBucket.objects.take('idle', 1, 3)
+        RateBucket.objects.take('busy', 1, 3)
+        RateBucket.objects.filter(key='idle').update(
+            updated_at=timezone.now() - timedelta(days=2)
+        )
+        prune_rate_buckets()
+
+        self.assertEqual(
+            list(RateBucket.objects.values_list('key', flat=True)),
+            ['busy']
+        )
+        self.assertIn(prune_rate_buckets.task_name, settings.JOB_SCHEDULE)
+
+
+@patch.object(TokenBucketThrottle, 'THROTTLE_RATES', RATES)
+class ThrottleApiTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@test.com', 'pass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reads_throttled(self):
+        """Test that reads past the rate get a 429 with Retry-After"""
+        for _ in range(2):
+            res = self.client.get(TAGS_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(res['Retry-After'], ('29', '30'))
+
+    def test_scopes_separate(self):
+        """Test that reads, writes and users have their own buckets"""
+        other = get_user_model().objects.create_user('other@test.com', 'x')
+        client = APIClient()
+        client.force_authenticate(other)
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        res = self.client.post(TAGS_URL, {'name': 'Dessert'})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = client.post(TAGS_URL, {'name': 'Dessert'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_login_throttled_by_address(self):
+        """Test that logins are limited per client address"""
+        payload = {'email': 'test@test.com', 'password': 'pass123'}
+        res = APIClient().post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = APIClient().post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        res = APIClient().post(TOKEN_URL, payload, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class ConcurrentRateBucketTests(TransactionTestCase):
+
+    def test_concurrent_takes(self):
+        """Test that concurrent clients never take more than the capacity"""
+        taken = []
+        start = threading.Barrier(8)
+
+        def take():
+            start.wait(5)
+            for _ in range(5):
+                if RateBucket.objects.take('k', 0.001, 10) is None:
+                    taken.append(1)
+            connection.close()
+
+        threads = [threading.Thread(target=take) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(taken), 10)
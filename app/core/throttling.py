@@ -0,0 +1,48 @@
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+from core.models import RateBucket
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Throttles clients with token buckets shared by every process
+
+    Requests are limited per user, or per address when anonymous, in the
+    `throttle_scope` of the view, falling back to the `read` scope for safe
+    methods and `write` otherwise. A rate of `100/min` allows bursts of 100
+    requests, refilled at 100 a minute.
+    """
+
+    def __init__(self):
+        # Rates depend on the scope, only known once the view is
+        pass
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is not None:
+            return scope
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'addr:{self.get_ident(request)}'
+        return f'{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+
+        num_requests, duration = self.parse_rate(self.rate)
+        self.delay = RateBucket.objects.take(
+            self.get_cache_key(request, view),
+            rate=num_requests / duration,
+            capacity=num_requests
+        )
+        return self.delay is None
+
+    def wait(self):
+        return self.delay
@@ -0,0 +1,74 @@
+import json
+from collections.abc import Sequence
+
+from django.core.cache import caches
+from django.db.models import prefetch_related_objects
+
+from rest_framework.renderers import JSONRenderer
+
+from recipe.serializers import RecipeSerializer
+
+
+class JSONFragments(Sequence):
+    """A JSON array kept as the already encoded bytes of its items
+
+    Renders by joining the bytes, and decodes them only when read as a
+    list, as tests and other renderers do.
+    """
+
+    def __init__(self, fragments):
+        self.fragments = list(fragments)
+
+    def render(self):
+        return b'[' + b','.join(self.fragments) + b']'
+
+    def tolist(self):
+        if not hasattr(self, '_items'):
+            self._items = [json.loads(item) for item in self.fragments]
+        return self._items
+
+    def __getitem__(self, index):
+        return self.tolist()[index]
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return self.tolist() == list(other)
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+
+def fragment_key(recipe):
+    return f'recipe:{recipe.pk}:{recipe.revision}'
+
+
+def recipe_fragments(recipes):
+    """Returns the RecipeSerializer JSON of recipes from the fragment cache
+
+    Fragments are keyed by the revision of their recipe, so only recipes
+    changed since they were cached are serialized again, with their
+    relations prefetched in one query each.
+    """
+    cache = caches['recipe_fragments']
+    keys = [fragment_key(recipe) for recipe in recipes]
+    fragments = cache.get_many(keys)
+    stale = [
+        recipe for recipe, key in zip(recipes, keys) if key not in fragments
+    ]
+    if stale:
+        prefetch_related_objects(stale, 'tags', 'ingredients')
+        renderer = JSONRenderer()
+        fresh = {
+            fragment_key(recipe): renderer.render(data)
+            for recipe, data in zip(
+                stale, RecipeSerializer(stale, many=True).data
+            )
+        }
+        cache.set_many(fresh)
+        fragments.update(fresh)
+
+    return JSONFragments(fragments[key] for key in keys)
@@ -0,0 +1,257 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.utils.translation import ugettext_lazy as _
+
+from PIL import Image
+from rest_framework import serializers
+
+# Room left in Content-Length for the multipart boundaries and headers
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Size of the reads copying a chunk body into a partial upload
+UPLOAD_COPY_SIZE = 64 * 1024
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """Stops a multipart upload once it streams more than max_bytes
+
+    The request is flagged with `upload_limit_exceeded` so the view can
+    answer 413 instead of reporting a missing file.
+    """
+
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or settings.RECIPE_IMAGE_MAX_BYTES
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.request.upload_limit_exceeded = True
+            raise StopUpload(connection_reset=True)
+
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def check_image_header(image_file):
+    """Validates size, format and dimensions of an uploaded image
+
+    Only the image header is parsed, so oversized or decompression bomb
+    files are refused before Pillow decodes any pixel data.
+    """
+    if image_file.size > settings.RECIPE_IMAGE_MAX_BYTES:
+        raise serializers.ValidationError(
+            _('Images must be at most {max} bytes').format(
+                max=settings.RECIPE_IMAGE_MAX_BYTES
+            )
+        )
+
+    try:
+        # Image.open only reads the header; pixels load on first access
+        image = Image.open(image_file)
+        image_format = image.format
+        width, height = image.size
+    except Exception:
+        raise serializers.ValidationError(_(
+            'Upload a valid image. The file you uploaded was either not an '
+            'image or a corrupted image.'
+        ))
+    finally:
+        image_file.seek(0)
+
+    if image_format not in settings.RECIPE_IMAGE_FORMATS:
+        raise serializers.ValidationError(
+            _('Unsupported image format {format}').format(format=image_format)
+        )
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise serializers.ValidationError(
+            _('Images must be at most {max} pixels').format(
+                max=settings.RECIPE_IMAGE_MAX_PIXELS
+            )
+        )
+
+
+class OffsetMismatch(Exception):
+    """Raised when a chunk does not start where the upload stands"""
+
+    def __init__(self, offset):
+        super().__init__(offset)
+        self.offset = offset
+
+
+def upload_offset(path):
+    """Returns how many bytes of a partial upload were received"""
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def append_chunk(path, stream, offset):
+    """Appends a request body to a partial upload and returns its new size
+
+    The body is copied in small reads, so it is never held in memory. The
+    file is locked meanwhile so retried chunks cannot interleave, and the
+    bytes received before a dropped connection are kept for the resume.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as part:
+        fcntl.flock(part, fcntl.LOCK_EX)
+        size = part.seek(0, os.SEEK_END)
+        if size != offset:
+            raise OffsetMismatch(size)
+
+        while stream is not None:
+            data = stream.read(UPLOAD_COPY_SIZE)
+            if not data:
+                break
+            part.write(data)
+
+        return part.tell()
+
+
+class CompletedUpload(File):
+    """Finished partial upload, validated and stored straight from disk"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class ResizedImageCache:
+    """On-disk cache of resized images kept under a byte budget
+
+    Hits refresh the file mtime and eviction drops the least recently used
+    variants first. Renders of the same variant are serialized with a
+    striped flock, so concurrent misses across threads and processes
+    render it only once. Renders add to a running size total, and only
+    the render taking it over budget scans the cache to evict, which also
+    resets the total to what is actually on disk.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path_for(self, source_name, width):
+        key = hashlib.sha1(f'{source_name}:{width}'.encode()).hexdigest()
+        return os.path.join(self.directory, key[:2], f'{key}.webp')
+
+    def _lock_path(self, path):
+        stripe = os.path.basename(path)[:2]
+        return os.path.join(self.directory, 'locks', f'{stripe}.lock')
+
+    def get(self, source_path, source_name, width):
+        """Returns the path of a variant, rendering it on first use"""
+        path = self.path_for(source_name, width)
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        lock_path = self._lock_path(path)
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(path):
+                    return path
+                size = self._render(source_path, path, width)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        if self._update_total(size) > self.max_bytes:
+            self.evict()
+        return path
+
+    def _update_total(self, added=0, total=None):
+        """Adds to (or sets) the running size total and returns it"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, 'size'), 'a+') as size_file:
+            fcntl.flock(size_file, fcntl.LOCK_EX)
+            if total is None:
+                size_file.seek(0)
+                total = int(size_file.read() or 0) + added
+            size_file.seek(0)
+            size_file.truncate()
+            size_file.write(str(total))
+
+        return total
+
+    def _render(self, source_path, path, width):
+        """Stores the source image resized to `width` as WebP
+
+        Returns the size of the stored file.
+        """
+        with Image.open(source_path) as image:
+            if image.width * image.height > settings.RECIPE_IMAGE_MAX_PIXELS:
+                raise ValueError('Source image is over the pixel budget')
+
+            width = min(width, image.width)
+            height = max(1, round(image.height * width / image.width))
+            # Lets JPEG decode at a reduced scale instead of full size
+            image.draft('RGB', (width, height))
+            mode = 'RGBA' if 'A' in image.getbands() else 'RGB'
+            resized = image.convert(mode).resize(
+                (width, height), Image.LANCZOS
+            )
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                resized.save(tmp_file, format='WEBP', quality=80)
+                size = tmp_file.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        return size
+
+    def _entries(self):
+        for stripe in os.scandir(self.directory):
+            if stripe.is_dir() and stripe.name != 'locks':
+                for entry in os.scandir(stripe.path):
+                    if entry.name.endswith('.webp'):
+                        yield entry
+
+    def evict(self):
+        """Removes the least recently used variants over the budget"""
+        entries = []
+        total = 0
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        self._update_total(total=total)
+
+
+def resized_image_cache():
+    """Returns the cache of resized recipe images set up in the settings"""
+    return ResizedImageCache(
+        settings.RECIPE_IMAGE_CACHE_DIR,
+        settings.RECIPE_IMAGE_CACHE_MAX_BYTES
+    )
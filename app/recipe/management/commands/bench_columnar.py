@@ -0,0 +1,54 @@
+import gzip
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from rest_framework.renderers import JSONRenderer
+
+from recipe.renderers import ColumnarRenderer
+from recipe.views import RecipeViewSet
+
+
+class Command(BaseCommand):
+    """Django command comparing the JSON and columnar recipe renderers"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def _sample_rows(self, count):
+        """Builds rows shaped like RecipeSerializer output"""
+        return [{
+            'id': i,
+            'title': f'Sample recipe {i}',
+            'time_minutes': random.randint(1, 180),
+            'price': f'{random.randint(100, 99999) / 100:.2f}',
+            'ingredients': random.sample(range(1, 500), random.randint(1, 12)),
+            'tags': random.sample(range(1, 50), random.randint(0, 4)),
+            'link': '',
+        } for i in range(1, count + 1)]
+
+    def _bench(self, renderer, rows, context, repeat):
+        """Returns the rendered size, gzip size and best encode time"""
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            content = renderer.render(rows, renderer_context=context)
+            best = min(best, time.perf_counter() - start)
+
+        return len(content), len(gzip.compress(content)), best * 1000
+
+    def handle(self, *args, **options):
+        rows = self._sample_rows(options['rows'])
+        context = {'view': RecipeViewSet(action='list')}
+        self.stdout.write(
+            f'{"renderer":<12}{"bytes":>12}{"gzip":>12}{"encode ms":>12}'
+        )
+        for renderer in (JSONRenderer(), ColumnarRenderer()):
+            size, zipped, elapsed = self._bench(
+                renderer, rows, context, options['repeat']
+            )
+            self.stdout.write(
+                f'{renderer.format:<12}{size:>12}{zipped:>12}{elapsed:>12.2f}'
+            )
@@ -0,0 +1,115 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.fragments import recipe_fragments
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Django command comparing the serializer and fragment recipe lists
+
+    Sample recipes are created in a transaction rolled back at the end.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--changed', type=float, default=0.1,
+            help='Share of recipes changed before the partly stale run'
+        )
+
+    def _sample_recipes(self, user, count):
+        """Creates recipes shaped like real ones for a throwaway user"""
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f'bench-tag-{i}') for i in range(50)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'bench-ingredient-{i}')
+            for i in range(500)
+        )
+        recipes = Recipe.objects.bulk_create(Recipe(
+            user=user,
+            title=f'Sample recipe {i}',
+            time_minutes=random.randint(1, 180),
+            price=random.randint(100, 99999) / 100,
+        ) for i in range(count))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag.pk)
+            for recipe in recipes
+            for tag in random.sample(tags, random.randint(0, 4))
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(
+                recipe_id=recipe.pk, ingredient_id=ingredient.pk
+            )
+            for recipe in recipes
+            for ingredient in random.sample(ingredients, random.randint(1, 12))
+        )
+
+    def _bench(self, render, repeat, before=None):
+        """Returns the best time in ms of a render, not timing `before`"""
+        best = float('inf')
+        for _ in range(repeat):
+            if before is not None:
+                before()
+            start = time.perf_counter()
+            render()
+            best = min(best, time.perf_counter() - start)
+
+        return best * 1000
+
+    def handle(self, *args, **options):
+        cache = caches['recipe_fragments']
+        renderer = JSONRenderer()
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                'bench-fragments@localhost', None
+            )
+            self._sample_recipes(user, options['rows'])
+            recipes = Recipe.objects.filter(user=user).order_by('-title')
+
+            def serializer_list():
+                renderer.render(
+                    RecipeSerializer(recipes.all(), many=True).data
+                )
+
+            def prefetched_list():
+                renderer.render(RecipeSerializer(
+                    recipes.prefetch_related('tags', 'ingredients'), many=True
+                ).data)
+
+            def fragment_list():
+                recipe_fragments(list(recipes.all())).render()
+
+            def change_some():
+                pks = random.sample(
+                    list(recipes.values_list('pk', flat=True)),
+                    int(options['rows'] * options['changed'])
+                )
+                Recipe.objects.filter(pk__in=pks).update(
+                    revision=F('revision') + 1
+                )
+
+            runs = (
+                ('serializer', serializer_list, None),
+                ('prefetched', prefetched_list, None),
+                ('cold', fragment_list, cache.clear),
+                ('stale', fragment_list, change_some),
+                ('warm', fragment_list, None),
+            )
+            self.stdout.write(f'{"path":<12}{"ms":>12}')
+            for name, render, before in runs:
+                elapsed = self._bench(render, options['repeat'], before)
+                self.stdout.write(f'{name:<12}{elapsed:>12.2f}')
+
+            transaction.set_rollback(True)
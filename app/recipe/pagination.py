@@ -0,0 +1,109 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(ordering, value, pk):
+    """Encodes the (sort value, id) position of the last row of a page"""
+    return base64.urlsafe_b64encode(
+        json.dumps([ordering, value, pk], separators=(',', ':')).encode()
+    ).decode()
+
+
+def decode_cursor(cursor, ordering, field):
+    """Decodes a cursor of the given ordering into a (value, id) position
+
+    The value is converted by the model field it is compared with. Raises
+    ValueError when the cursor is malformed or from another ordering.
+    """
+    try:
+        cursor_ordering, value, pk = json.loads(
+            base64.urlsafe_b64decode(cursor.encode())
+        )
+        if cursor_ordering != ordering:
+            raise ValueError('Cursor of another ordering')
+        value = field.to_python(value)
+        if value is None:
+            raise ValueError('Cursor without value')
+        return value, int(pk)
+    except (TypeError, AttributeError, DjangoValidationError) as exc:
+        raise ValueError(str(exc))
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on (ordering field, id) without OFFSET
+
+    Each page starts strictly after the last (value, id) of the previous
+    one, so with an index on (user, field, id) any depth costs the same.
+    Pagination only applies when page_size or cursor is given, so plain
+    list calls keep returning every row.
+    """
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.page_size_query_param not in params and \
+                self.cursor_query_param not in params:
+            return None
+
+        ordering = queryset.query.order_by[0]
+        field = ordering.lstrip('-')
+        try:
+            page_size = int(params.get(
+                self.page_size_query_param, settings.RECIPE_PAGE_SIZE
+            ))
+            cursor = params.get(self.cursor_query_param)
+            position = decode_cursor(
+                cursor, ordering, queryset.model._meta.get_field(field)
+            ) if cursor else None
+        except ValueError:
+            raise ValidationError(_('Invalid cursor or page size'))
+        page_size = min(max(page_size, 1), settings.RECIPE_MAX_PAGE_SIZE)
+        if position is not None:
+            value, pk = position
+            after, bound = ('lt', 'lte') if ordering[0] == '-' else \
+                ('gt', 'gte')
+            # The redundant bound lets the index range start at the cursor
+            queryset = queryset.filter(
+                Q(**{f'{field}__{after}': value}) |
+                Q(**{field: value, f'pk__{after}': pk}),
+                **{f'{field}__{bound}': value}
+            )
+
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            value = getattr(last, field)
+            if not isinstance(value, (str, int)):
+                value = str(value)
+            self.next_cursor = encode_cursor(ordering, value, last.pk)
+        self.request = request
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,55 @@
+import json
+
+from django.conf import settings
+
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from recipe.renderers import ColumnarRenderer
+
+
+def columns_to_rows(count, columns, max_count=None):
+    """Rebuilds the list of dicts encoded by `rows_to_columns`
+
+    The count and the column lengths are checked before any row is built,
+    so a small payload cannot claim a huge number of rows.
+    """
+    if type(count) is not int or count < 0:
+        raise ValueError('Count must be a non-negative integer')
+    if max_count is not None and count > max_count:
+        raise ValueError(f'Count must be at most {max_count}')
+    for key, column in columns.items():
+        if isinstance(column, dict):
+            if len(column['offsets']) != count + 1:
+                raise ValueError(f'Column {key} needs {count + 1} offsets')
+        elif len(column) != count:
+            raise ValueError(f'Column {key} needs {count} values')
+
+    rows = [{} for _ in range(count)]
+    for key, column in columns.items():
+        if isinstance(column, dict):
+            offsets = column['offsets']
+            values = column['values']
+            for i, row in enumerate(rows):
+                row[key] = values[offsets[i]:offsets[i + 1]]
+        else:
+            for row, value in zip(rows, column):
+                row[key] = value
+
+    return rows
+
+
+class ColumnarParser(parsers.BaseParser):
+    """Parses a columnar payload back into a list of objects"""
+    media_type = ColumnarRenderer.media_type
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            payload = json.loads(stream.read().decode(encoding))
+            return columns_to_rows(
+                payload['count'], payload['columns'], settings.RECIPE_BULK_MAX
+            )
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            raise ParseError(f'Columnar parse error - {exc}')
@@ -0,0 +1,117 @@
+import json
+
+from rest_framework import renderers, serializers
+from rest_framework.utils import encoders
+
+from recipe.fragments import JSONFragments
+
+
+def rows_to_columns(rows, decimal_fields=()):
+    """Turns a list of flat dicts into one array per key
+
+    List values (relations) are flattened into an `offsets` array of
+    len(rows) + 1 entries and a `values` array, so the relation of row i is
+    values[offsets[i]:offsets[i + 1]].
+    """
+    columns = {}
+    if not rows:
+        return columns
+
+    for key in rows[0]:
+        column = [row[key] for row in rows]
+        if isinstance(column[0], list):
+            offsets = [0]
+            values = []
+            for items in column:
+                values.extend(items)
+                offsets.append(len(values))
+            columns[key] = {'offsets': offsets, 'values': values}
+        elif key in decimal_fields:
+            columns[key] = [
+                float(value) if value is not None else None
+                for value in column
+            ]
+        else:
+            columns[key] = column
+
+    return columns
+
+
+class ColumnarRenderer(renderers.BaseRenderer):
+    """Renders a list of objects as column arrays instead of rows"""
+    media_type = 'application/vnd.recipe.columnar+json'
+    format = 'columnar'
+    charset = None
+
+    def _decimal_fields(self, renderer_context):
+        """Returns the names of decimal fields of the view serializer"""
+        view = renderer_context.get('view')
+        if view is None:
+            return ()
+
+        fields = view.get_serializer_class()().fields
+        return {
+            name for name, field in fields.items()
+            if isinstance(field, serializers.DecimalField)
+        }
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        response = renderer_context.get('response')
+        if response is not None and response.exception:
+            payload = data
+        else:
+            # Envelopes (pages, multi-gets, expansions) keep their other keys
+            payload = {}
+            if isinstance(data, dict) and 'results' in data:
+                payload = {k: v for k, v in data.items() if k != 'results'}
+                data = data['results']
+            rows = data if isinstance(data, list) else [data]
+            payload.update({
+                'count': len(rows),
+                'columns': rows_to_columns(
+                    rows, self._decimal_fields(renderer_context)
+                ),
+            })
+
+        return json.dumps(
+            payload,
+            cls=encoders.JSONEncoder,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(',', ':'),
+        ).encode()
+
+
+class FragmentJSONRenderer(renderers.JSONRenderer):
+    """JSON renderer splicing pre-encoded JSONFragments into the output
+
+    Lists of fragments, bare or as the results of an envelope, are joined
+    as they are instead of being decoded and encoded again. Indented output
+    goes through the regular encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if isinstance(data, JSONFragments):
+            return data.render()
+        if not isinstance(data, dict) or \
+                not isinstance(data.get('results'), JSONFragments):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        members = []
+        for key, value in data.items():
+            if isinstance(value, JSONFragments):
+                content = value.render()
+            elif value is None:
+                content = b'null'
+            else:
+                content = super().render(value)
+            members.append(super().render(key) + b':' + content)
+
+        return b'{' + b','.join(members) + b'}'
@@ -1,14 +1,19 @@
+from django.conf import settings
+from django.utils.translation import ugettext_lazy as _
+
 from rest_framework import serializers
 
-from core.models import Tag, Ingredient, Recipe
+from core.models import Tag, Ingredient, Recipe, Tombstone, ImageUpload, \
+                        IngredientPair, RECIPE_PRICE_BUCKETS
+from recipe.images import check_image_header, upload_offset
 
 class TagSerializer(serializers.ModelSerializer):
     """Serializer for tag objects"""
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -16,8 +21,18 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
-        fields = ( 'id', 'name')
-        read_only_fields = ('id',)
+        fields = ( 'id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
+
+
+class IngredientPairSerializer(serializers.ModelSerializer):
+    """Serializer for an ingredient often used along with another"""
+    id = serializers.IntegerField(source='other_id')
+    name = serializers.CharField(source='other.name')
+
+    class Meta:
+        model = IngredientPair
+        fields = ('id', 'name', 'count')
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -39,6 +54,24 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id',)
 
+    # Serializers of the relations that ?expand= can share in `included`
+    included_serializers = {
+        'tags': TagSerializer,
+        'ingredients': IngredientSerializer,
+    }
+
+    def to_representation(self, instance):
+        """Also adds the expanded relations to the shared `included` map"""
+        data = super().to_representation(instance)
+        included = self.context.get('included') or {}
+        for relation, objects in included.items():
+            serializer_class = self.included_serializers[relation]
+            for obj in getattr(instance, relation).all():
+                if str(obj.pk) not in objects:
+                    objects[str(obj.pk)] = serializer_class(obj).data
+
+        return data
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serialize a recipe detail"""
@@ -46,10 +79,105 @@ class RecipeDetailSerializer(RecipeSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
+class RecipeSimilarSerializer(RecipeSerializer):
+    """Serialize a recipe along with its similarity to another one"""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('similarity',)
+
+
+class ShoppingListItemSerializer(serializers.Serializer):
+    """Serializer for one merged ingredient of a shopping list"""
+    id = serializers.IntegerField(source='ingredient_id')
+    name = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+    recipes = serializers.ListField(child=serializers.IntegerField())
+
+
+class BoundedImageField(serializers.ImageField):
+    """Image field checking limits on the header before decoding"""
+
+    def to_internal_value(self, data):
+        if hasattr(data, 'size'):
+            check_image_header(data)
+        return super().to_internal_value(data)
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes"""
+    image = BoundedImageField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'image')
         read_only_fields = ('id',)
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Serializer for resumable recipe image uploads"""
+    offset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImageUpload
+        fields = ('id', 'filename', 'size', 'offset')
+        read_only_fields = ('id',)
+
+    def get_offset(self, obj):
+        return upload_offset(obj.path)
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.RECIPE_IMAGE_MAX_BYTES:
+            raise serializers.ValidationError(
+                _('Images must be at most {max} bytes').format(
+                    max=settings.RECIPE_IMAGE_MAX_BYTES
+                )
+            )
+        return value
+
+
+class RecipeStatsSerializer(serializers.Serializer):
+    """Serializer for the recipe statistics of a user"""
+    recipe_count = serializers.IntegerField()
+    avg_time_minutes = serializers.SerializerMethodField()
+    avg_price = serializers.SerializerMethodField()
+    price_distribution = serializers.SerializerMethodField()
+    top_tags = TagSerializer(many=True)
+    top_ingredients = IngredientSerializer(many=True)
+
+    def get_avg_time_minutes(self, obj):
+        if not obj.recipe_count:
+            return None
+        return round(obj.time_minutes_total / obj.recipe_count, 2)
+
+    def get_avg_price(self, obj):
+        if not obj.recipe_count:
+            return None
+        return serializers.DecimalField(
+            max_digits=None, decimal_places=2
+        ).to_representation(obj.price_total / obj.recipe_count)
+
+    def get_price_distribution(self, obj):
+        return [
+            {'min': lower, 'max': upper, 'count': getattr(obj, name)}
+            for name, lower, upper in RECIPE_PRICE_BUCKETS
+        ]
+
+
+class TombstoneSerializer(serializers.ModelSerializer):
+    """Serializer for deleted object traces"""
+    id = serializers.IntegerField(source='object_id')
+
+    class Meta:
+        model = Tombstone
+        fields = ('model', 'id', 'deleted_at')
+
+
+class SyncSerializer(serializers.Serializer):
+    """Serializer for one page of a delta sync"""
+    recipes = RecipeSerializer(many=True)
+    tags = TagSerializer(many=True)
+    ingredients = IngredientSerializer(many=True)
+    deleted = TombstoneSerializer(many=True)
+    cursor = serializers.CharField()
+    has_more = serializers.BooleanField()
@@ -0,0 +1,18 @@
+from django.conf import settings
+
+from core.jobs import task
+from core.models import Recipe
+from recipe.images import resized_image_cache
+
+
+@task
+def warm_resized_images(recipe_id):
+    """Renders every resized variant of a recipe image ahead of requests"""
+    image = Recipe.objects.image_name(recipe_id)
+    if not image:
+        return
+
+    storage = Recipe._meta.get_field('image').storage
+    cache = resized_image_cache()
+    for width in settings.RECIPE_IMAGE_WIDTHS:
+        cache.get(storage.path(image), image, width)
@@ -0,0 +1,150 @@
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Recipe, IdempotencyKey
+from core.tasks import prune_idempotency_keys
+from recipe.views import BaseRecipeAttrViewSet
+
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class IdempotencyApiTests(TestCase):
+    """Tests replaying POSTs sent with an Idempotency-Key"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test123',
+            name='test'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, url, payload, key='key-1', client=None):
+        return (client or self.client).post(
+            url, payload, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_first_response(self):
+        """Tests that a retried tag creation returns the first response"""
+        first = self.post(TAGS_URL, {'name': 'Vegan'})
+        retry = self.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_key_reused_for_other_request(self):
+        """Tests that a key cannot be replayed for a different body"""
+        self.post(TAGS_URL, {'name': 'Vegan'})
+        res = self.post(TAGS_URL, {'name': 'Dessert'})
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    def test_keys_scoped_to_user(self):
+        """Tests that users do not share idempotency keys"""
+        other = get_user_model().objects.create_user('other@test.com', 'x')
+        client = APIClient()
+        client.force_authenticate(other)
+        payload = {
+            'title': 'Soup', 'time_minutes': 5, 'price': '2.00',
+            'tags': [], 'ingredients': []
+        }
+        self.post(RECIPES_URL, payload)
+        res = self.post(RECIPES_URL, payload, client=client)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    @override_settings(IDEMPOTENCY_KEY_TTL=-1)
+    def test_expired_key_runs_again(self):
+        """Tests that keys past their TTL no longer replay"""
+        payload = {
+            'title': 'Soup', 'time_minutes': 5, 'price': '2.00',
+            'tags': [], 'ingredients': []
+        }
+        self.post(RECIPES_URL, payload)
+        res = self.post(RECIPES_URL, payload)
+
+        self.assertFalse(res.has_header('Idempotent-Replayed'))
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_expired_keys_pruned(self):
+        """Tests that the periodic prune drops the keys past their TTL"""
+        self.post(TAGS_URL, {'name': 'Vegan'}, key='old')
+        self.post(TAGS_URL, {'name': 'Stew'}, key='new')
+        IdempotencyKey.objects.filter(key='old').update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+        prune_idempotency_keys()
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list('key', flat=True)),
+            ['new']
+        )
+        self.assertIn(
+            prune_idempotency_keys.task_name, settings.JOB_SCHEDULE
+        )
+
+    def test_key_too_long(self):
+        """Tests rejecting oversized keys"""
+        res = self.post(TAGS_URL, {'name': 'Vegan'}, key='k' * 256)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConcurrentIdempotencyApiTests(TransactionTestCase):
+    """Tests concurrent duplicates of an idempotent request"""
+
+    def test_duplicate_waits_for_in_flight_request(self):
+        """Tests that a concurrent duplicate replays instead of running"""
+        user = get_user_model().objects.create_user('test@test.com', 'x')
+        perform_create = BaseRecipeAttrViewSet.perform_create
+
+        def slow_perform_create(view, serializer):
+            time.sleep(0.3)
+            perform_create(view, serializer)
+
+        responses = []
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(user)
+            responses.append(client.post(
+                TAGS_URL, {'name': 'Vegan'}, format='json',
+                HTTP_IDEMPOTENCY_KEY='key-1'
+            ))
+            connection.close()
+
+        with patch.object(
+            BaseRecipeAttrViewSet, 'perform_create', slow_perform_create
+        ):
+            threads = [threading.Thread(target=post) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(
+            [res.status_code for res in responses],
+            [status.HTTP_201_CREATED] * 2
+        )
+        self.assertEqual(responses[0].data, responses[1].data)
+        self.assertEqual(Tag.objects.count(), 1)
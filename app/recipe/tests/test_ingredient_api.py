@@ -5,7 +5,7 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Ingredient, Recipe
+from core.models import Ingredient, IngredientPair, Recipe
 
 from recipe.serializers import IngredientSerializer
 
@@ -97,6 +97,7 @@ class PrivateIngredientAPITests(TestCase):
         recipe.ingredients.add(ingredient1)
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+        ingredient1.refresh_from_db()
         serializer1 = IngredientSerializer(ingredient1)
         serializer2 = IngredientSerializer(ingredient2)
         self.assertIn(serializer1.data, res.data)
@@ -122,3 +123,82 @@ class PrivateIngredientAPITests(TestCase):
         recipe2.ingredients.add(ingredient)
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
         self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['recipe_count'], 2)
+
+
+def used_with_url(ingredient_id):
+    """Return the often used with URL of an ingredient"""
+    return reverse('recipe:ingredient-used-with', args=[ingredient_id])
+
+
+class IngredientPairTests(TestCase):
+    """Tests the ingredient co-occurrence counts"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test123',
+            name='Jones'
+        )
+        self.client.force_authenticate(self.user)
+        self.flour, self.egg, self.milk, self.salt = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Flour', 'Egg', 'Milk', 'Salt')
+        ]
+
+    def sample_recipe(self, *ingredients):
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample',
+            time_minutes=10,
+            price=5.00
+        )
+        recipe.ingredients.add(*ingredients)
+        return recipe
+
+    def pairs(self):
+        return {
+            (pair.ingredient_id, pair.other_id): pair.count
+            for pair in IngredientPair.objects.all()
+        }
+
+    def test_pairs_maintained_incrementally(self):
+        """Tests that recipe changes keep the pairs equal to a rebuild"""
+        pancakes = self.sample_recipe(self.flour, self.egg)
+        bread = self.sample_recipe(self.flour, self.salt)
+        self.milk.recipe_set.add(pancakes, bread)
+        pancakes.ingredients.remove(self.egg, self.salt)
+        self.salt.recipe_set.remove(bread)
+        self.sample_recipe(self.egg, self.milk).ingredients.clear()
+        self.sample_recipe(self.egg, self.salt).delete()
+        self.egg.recipe_set.add(bread)
+        self.milk.recipe_set.clear()
+
+        incremental = self.pairs()
+        IngredientPair.objects.rebuild()
+        self.assertEqual(incremental, self.pairs())
+        self.assertEqual(incremental[self.flour.id, self.egg.id], 1)
+
+    def test_used_with(self):
+        """Tests listing the ingredients most often used with another"""
+        self.sample_recipe(self.flour, self.egg, self.milk)
+        self.sample_recipe(self.flour, self.egg)
+        self.sample_recipe(self.salt)
+        res = self.client.get(used_with_url(self.flour.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': self.egg.id, 'name': 'Egg', 'count': 2},
+            {'id': self.milk.id, 'name': 'Milk', 'count': 1},
+        ])
+        res = self.client.get(used_with_url(self.flour.id), {'limit': 1})
+        self.assertEqual(len(res.data), 1)
+
+    def test_used_with_other_user_ingredient(self):
+        """Tests that ingredients of other users are not found"""
+        other = get_user_model().objects.create_user('other@test.com', 'x')
+        ingredient = Ingredient.objects.create(user=other, name='Kale')
+        res = self.client.get(used_with_url(ingredient.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
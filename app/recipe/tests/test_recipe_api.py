@@ -1,29 +1,63 @@
+import base64
 import tempfile
+import io
+import json
 import os
+import threading
+import time
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 
+from django.core.files import File
+
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, Tag, Ingredient, ImageUpload, \
+                        Job, lock_image, release_recipe_image
+from core.storage import ContentAddressedStorage
 
-from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, \
+                               TagSerializer, IngredientSerializer
+from recipe.renderers import ColumnarRenderer
+from recipe.images import ResizedImageCache
+from recipe.tasks import warm_resized_images
 
 RECIPES_URL = reverse('recipe:recipe-list')
+STATS_URL = reverse('recipe:recipe-stats')
+
 
 def image_upload_url(recipe_id):
     """Returns URL for recipe image upload"""
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
+
 def detail_url(recipe_id):
     """Creates the detail url for a recipe"""
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
+
+def upload_image(client, recipe_id, color='red'):
+    """Uploads a small JPEG of the given color to a recipe"""
+    with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+        img = Image.new('RGB', (10, 10), color)
+        img.save(ntf, format='JPEG')
+        ntf.seek(0)
+        return client.post(
+            image_upload_url(recipe_id),
+            {'image': ntf},
+            format='multipart'
+        )
+
+
 def sample_recipe(user, **params):
     """Create and return a sample recipe"""
     defaults = {
@@ -35,10 +69,12 @@ def sample_recipe(user, **params):
 
     return Recipe.objects.create(user=user, **defaults)
 
+
 def sample_tag(user, name='Main course'):
     """Creates and return a sample tag"""
     return Tag.objects.create(user=user, name=name)
 
+
 def sample_ingredient(user, name='Cinnamon'):
     """Creates and returns a sample ingredient"""
     return Ingredient.objects.create(user=user, name=name)
@@ -183,6 +219,371 @@ class PrivateRecipeApiTests(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(tags.count(), 0)
 
+    def test_recipe_stats(self):
+        """Tests aggregating the recipe statistics of the user"""
+        tag = sample_tag(user=self.user)
+        recipe = sample_recipe(user=self.user, time_minutes=10, price=4.00)
+        recipe.tags.add(tag)
+        sample_recipe(user=self.user, time_minutes=20, price=12.00)
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertEqual(res.data['avg_time_minutes'], 15)
+        self.assertEqual(res.data['avg_price'], '8.00')
+        counts = [b['count'] for b in res.data['price_distribution']]
+        self.assertEqual(counts, [1, 0, 1, 0, 0])
+        self.assertEqual(res.data['top_tags'][0]['name'], tag.name)
+        self.assertEqual(res.data['top_tags'][0]['recipe_count'], 1)
+
+    def test_recipe_stats_empty(self):
+        """Tests statistics for a user without recipes"""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertIsNone(res.data['avg_price'])
+
+    @override_settings(RECIPE_STATS_MATERIALIZED=True)
+    def test_materialized_recipe_stats(self):
+        """Tests the materialized statistics follow recipe changes"""
+        self.client.get(STATS_URL)
+        recipe = sample_recipe(user=self.user, time_minutes=10, price=4.00)
+        sample_recipe(user=self.user, time_minutes=30, price=60.00)
+        self.client.patch(detail_url(recipe.id), {'price': '15.00'})
+        Recipe.objects.filter(price=60).get().delete()
+        sample_recipe(user=self.user, time_minutes=20, price=7.00)
+
+        with self.assertNumQueries(4):
+            res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertEqual(res.data['avg_time_minutes'], 15)
+        self.assertEqual(res.data['avg_price'], '11.00')
+        counts = [b['count'] for b in res.data['price_distribution']]
+        self.assertEqual(counts, [0, 1, 1, 0, 0])
+
+    def test_retrieve_recipes_columnar(self):
+        """Tests listing recipes in the columnar format"""
+        recipe1 = sample_recipe(user=self.user, title='Curry', price=7.50)
+        recipe1.tags.add(sample_tag(user=self.user))
+        recipe2 = sample_recipe(user=self.user, title='Bread', price=2.00)
+        res = self.client.get(RECIPES_URL, {'format': 'columnar'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], ColumnarRenderer.media_type)
+        payload = json.loads(res.content)
+        self.assertEqual(payload['count'], 2)
+        self.assertEqual(payload['columns']['id'], [recipe1.id, recipe2.id])
+        self.assertEqual(payload['columns']['price'], [7.5, 2.0])
+        self.assertEqual(payload['columns']['tags']['offsets'], [0, 1, 1])
+
+    def test_retrieve_recipes_columnar_accept(self):
+        """Tests selecting the columnar format through Accept"""
+        sample_recipe(user=self.user)
+        res = self.client.get(
+            RECIPES_URL,
+            HTTP_ACCEPT=ColumnarRenderer.media_type
+        )
+
+        self.assertEqual(json.loads(res.content)['count'], 1)
+
+    def test_bulk_create_recipes_columnar(self):
+        """Tests creating several recipes from a columnar payload"""
+        tag = sample_tag(user=self.user)
+        payload = {'count': 2, 'columns': {
+            'title': ['Soup', 'Stew'],
+            'time_minutes': [10, 90],
+            'price': [3.5, 12.25],
+            'tags': {'offsets': [0, 1, 1], 'values': [tag.id]},
+            'ingredients': {'offsets': [0, 0, 0], 'values': []},
+        }}
+        res = self.client.post(
+            RECIPES_URL,
+            json.dumps(payload),
+            content_type=ColumnarRenderer.media_type
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        soup = Recipe.objects.get(user=self.user, title='Soup')
+        self.assertEqual(str(soup.price), '3.50')
+        self.assertEqual(list(soup.tags.all()), [tag])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_recipes_columnar_malformed(self):
+        """Tests rejecting a columnar payload with mismatched columns"""
+        payload = {'count': 2, 'columns': {'title': ['Soup']}}
+        res = self.client.post(
+            RECIPES_URL,
+            json.dumps(payload),
+            content_type=ColumnarRenderer.media_type
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_BULK_MAX=2)
+    def test_bulk_create_recipes_columnar_bad_count(self):
+        """Tests rejecting columnar counts out of range before parsing"""
+        for count, titles in (
+            (10 ** 9, ['Soup']), (3, ['Soup'] * 3), (-1, []),
+            ('2', ['Soup', 'Stew']), (2, ['Soup', 'Stew', 'Salad']),
+        ):
+            payload = {'count': count, 'columns': {'title': titles}}
+            res = self.client.post(
+                RECIPES_URL,
+                json.dumps(payload),
+                content_type=ColumnarRenderer.media_type
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertFalse(Recipe.objects.exists())
+
+
+class RecipeListQueryTests(TestCase):
+    """Tests filtering, sorting and paginating the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test',
+            name='test'
+        )
+        self.client.force_authenticate(self.user)
+
+    def ids(self, res):
+        return [recipe['id'] for recipe in res.data]
+
+    def test_range_filters(self):
+        """Tests filtering recipes by time and price ranges"""
+        quick = sample_recipe(user=self.user, time_minutes=10, price=4)
+        sample_recipe(user=self.user, time_minutes=45, price=4)
+        sample_recipe(user=self.user, time_minutes=20, price=30)
+        res = self.client.get(RECIPES_URL, {
+            'time_minutes_max': 30,
+            'price_min': '1.50',
+            'price_max': '5',
+        })
+
+        self.assertEqual(self.ids(res), [quick.id])
+
+    def test_ordering(self):
+        """Tests sorting recipes with ties broken by id"""
+        cheap = sample_recipe(user=self.user, price=2)
+        dear = sample_recipe(user=self.user, price=20)
+        tied = sample_recipe(user=self.user, price=2)
+        res = self.client.get(RECIPES_URL, {'ordering': 'price'})
+        self.assertEqual(self.ids(res), [cheap.id, tied.id, dear.id])
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-price'})
+        self.assertEqual(self.ids(res), [dear.id, tied.id, cheap.id])
+
+    def test_invalid_query(self):
+        """Tests rejecting unknown orderings and malformed ranges"""
+        for params in (
+            {'ordering': 'link'},
+            {'ordering': '--id'},
+            {'price_min': 'cheap'},
+            {'cursor': 'garbage'},
+        ):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_multi_get(self):
+        """Tests fetching recipes by ids in the requested order"""
+        other = get_user_model().objects.create_user('other@test.com', 'x')
+        theirs = sample_recipe(user=other)
+        recipes = []
+        for i in range(4):
+            recipe = sample_recipe(user=self.user)
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {i}'))
+            recipes.append(recipe)
+        ids = [recipes[2].id, recipes[0].id, theirs.id, 9999]
+
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL, {
+                'ids': ','.join(str(pk) for pk in ids)
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipes[2].id, recipes[0].id]
+        )
+        self.assertEqual(res.data['not_found'], [theirs.id, 9999])
+
+        with self.assertNumQueries(4):
+            self.client.get(RECIPES_URL, {
+                'ids': ','.join(str(recipe.id) for recipe in recipes)
+            })
+
+    @override_settings(MULTI_GET_MAX_IDS=2)
+    def test_multi_get_invalid(self):
+        """Tests rejecting malformed or too long id lists"""
+        for ids in ('1,two', '1,2,3'):
+            res = self.client.get(RECIPES_URL, {'ids': ids})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expand_relations(self):
+        """Tests sharing the tags and ingredients of listed recipes"""
+        vegan = sample_tag(user=self.user, name='Vegan')
+        salt = sample_ingredient(user=self.user, name='Salt')
+        for title in ('Soup', 'Stew', 'Salad'):
+            recipe = sample_recipe(user=self.user, title=title)
+            recipe.tags.add(vegan)
+            recipe.ingredients.add(salt)
+
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL, {'expand': 'tags,ingredients'})
+
+        vegan.refresh_from_db()
+        salt.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertEqual(res.data['results'][0]['tags'], [vegan.id])
+        self.assertEqual(res.data['included'], {
+            'tags': {str(vegan.id): TagSerializer(vegan).data},
+            'ingredients': {str(salt.id): IngredientSerializer(salt).data},
+        })
+
+    def test_expand_with_pagination_and_columnar(self):
+        """Tests that expansions follow pages and columnar responses"""
+        vegan = sample_tag(user=self.user, name='Vegan')
+        sample_recipe(user=self.user).tags.add(vegan)
+        sample_recipe(user=self.user)
+        res = self.client.get(
+            RECIPES_URL,
+            {'expand': 'tags', 'page_size': 1, 'ordering': 'id'}
+        )
+        vegan.refresh_from_db()
+        self.assertEqual(res.data['included'], {
+            'tags': {str(vegan.id): TagSerializer(vegan).data},
+        })
+        self.assertIsNotNone(res.data['next'])
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'expand': 'tags', 'format': 'columnar'}
+        )
+        payload = json.loads(res.content)
+        self.assertEqual(payload['count'], 2)
+        self.assertIn(str(vegan.id), payload['included']['tags'])
+
+    def test_expand_unknown_relation(self):
+        """Tests rejecting relations that cannot be expanded"""
+        res = self.client.get(RECIPES_URL, {'expand': 'user'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_keyset_pagination(self):
+        """Tests walking every sort order in pages across ties"""
+        for minutes in (5, 5, 5, 10, 10, 20, 30):
+            sample_recipe(user=self.user, time_minutes=minutes)
+
+        for ordering in ('time_minutes', '-time_minutes', '-title', 'id'):
+            expected = self.ids(
+                self.client.get(RECIPES_URL, {'ordering': ordering})
+            )
+            seen = []
+            params = {'ordering': ordering, 'page_size': 2}
+            while True:
+                res = self.client.get(RECIPES_URL, params)
+                seen += [recipe['id'] for recipe in res.data['results']]
+                if res.data['next'] is None:
+                    break
+                query = parse_qs(urlparse(res.data['next']).query)
+                params['cursor'] = query['cursor'][0]
+
+            self.assertEqual(seen, expected)
+
+    def test_keyset_cursor_checked(self):
+        """Tests rejecting cursors of other orderings or forged values"""
+        for title in ('abc', 'def', 'ghi'):
+            sample_recipe(user=self.user, title=title)
+        res = self.client.get(
+            RECIPES_URL, {'ordering': 'title', 'page_size': 1}
+        )
+        cursor = parse_qs(urlparse(res.data['next']).query)['cursor'][0]
+
+        def forged(*position):
+            return base64.urlsafe_b64encode(
+                json.dumps(position).encode()
+            ).decode()
+
+        for ordering, cursor in (
+            ('price', cursor),
+            ('time_minutes', forged('time_minutes', 'abc', 1)),
+            ('price', forged('price', None, 1)),
+            ('price', forged('price', 'abc', 1)),
+        ):
+            res = self.client.get(RECIPES_URL, {
+                'ordering': ordering, 'page_size': 1, 'cursor': cursor
+            })
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeFragmentTests(TestCase):
+    """Tests serving the recipe list from cached serialized recipes"""
+
+    def setUp(self):
+        caches['recipe_fragments'].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test',
+            name='test'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = sample_tag(user=self.user)
+        self.recipes = []
+        for title in ('Soup', 'Stew', 'Salad'):
+            recipe = sample_recipe(user=self.user, title=title)
+            recipe.tags.add(self.tag)
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'{title} stock')
+            )
+            self.recipes.append(recipe)
+
+    def assertListed(self, res):
+        recipes = Recipe.objects.filter(user=self.user).order_by('-title')
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(json.loads(res.content), serializer.data)
+
+    def test_fragments_reused(self):
+        """Tests that unchanged recipes are not serialized again"""
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL)
+        self.assertListed(res)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPES_URL)
+        self.assertListed(res)
+
+    def test_fragments_follow_changes(self):
+        """Tests that saves and relation changes serialize recipes again"""
+        self.client.get(RECIPES_URL)
+        revisions = dict(Recipe.objects.values_list('pk', 'revision'))
+        soup, stew, salad = self.recipes
+        self.client.patch(detail_url(soup.id), {'title': 'Broth'})
+        stew.tags.add(sample_tag(user=self.user, name='Vegan'))
+        Ingredient.objects.filter(recipe=salad).delete()
+
+        for pk, revision in Recipe.objects.values_list('pk', 'revision'):
+            self.assertEqual(revision, revisions[pk] + 1)
+        self.assertListed(self.client.get(RECIPES_URL))
+
+    def test_fragments_paginated(self):
+        """Tests splicing cached recipes into a page envelope"""
+        self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        payload = json.loads(res.content)
+        self.assertEqual(
+            [recipe['title'] for recipe in payload['results']],
+            ['Stew', 'Soup']
+        )
+        self.assertIsNotNone(payload['next'])
+        self.assertEqual(payload['results'], res.data['results'])
+
 
 class RecipeImageUploadTests(TestCase):
 
@@ -213,6 +614,76 @@ class RecipeImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def test_upload_identical_images_deduplicated(self):
+        """Tests that identical uploads share one file written once"""
+        recipe2 = sample_recipe(user=self.user)
+        with patch.object(
+            ContentAddressedStorage, '_save',
+            autospec=True,
+            side_effect=ContentAddressedStorage._save
+        ) as save:
+            upload_image(self.client, self.recipe.id)
+            upload_image(self.client, recipe2.id)
+
+        self.recipe.refresh_from_db()
+        recipe2.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, recipe2.image.name)
+        self.assertEqual(save.call_count, 1)
+        digest = os.path.splitext(os.path.basename(self.recipe.image.name))[0]
+        with open(self.recipe.image.path, 'rb') as image_file:
+            self.assertEqual(
+                ContentAddressedStorage().digest(File(image_file)),
+                digest
+            )
+
+    def test_upload_identical_image_touches_file(self):
+        """Tests that a deduplicated upload refreshes the file mtime"""
+        upload_image(self.client, self.recipe.id)
+        self.recipe.refresh_from_db()
+        os.utime(self.recipe.image.path, (0, 0))
+
+        upload_image(self.client, sample_recipe(user=self.user).id)
+        self.assertGreater(os.path.getmtime(self.recipe.image.path), 0)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=100)
+    def test_upload_image_content_length_too_large(self):
+        """Tests rejecting uploads by their declared Content-Length"""
+        res = upload_image(self.client, self.recipe.id)
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=100)
+    def test_upload_image_streamed_too_large(self):
+        """Tests stopping uploads that stream more than the limit"""
+        with patch('recipe.views.MULTIPART_OVERHEAD', 1024 * 1024):
+            res = upload_image(self.client, self.recipe.id)
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=99)
+    def test_upload_image_too_many_pixels(self):
+        """Tests refusing images over the pixel budget"""
+        with patch('PIL.ImageFile.ImageFile.load') as load:
+            res = upload_image(self.client, self.recipe.id)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        load.assert_not_called()
+
+    @override_settings(RECIPE_IMAGE_FORMATS=('PNG',))
+    def test_upload_image_format_not_allowed(self):
+        """Tests refusing image formats outside the allowed list"""
+        res = upload_image(self.client, self.recipe.id)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_upload_image_bad_request(self):
         """Tests uploading an invalid image"""
         url = image_upload_url(self.recipe.id)
@@ -258,3 +729,454 @@ class RecipeImageUploadTests(TestCase):
         self.assertIn(serializer1.data, res.data)
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
+
+
+class RecipeImageReclaimTests(TransactionTestCase):
+    """Tests that unreferenced image files are reclaimed"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='pass123',
+            name='Bob'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_replaced_image_reclaimed(self):
+        """Tests that replacing an image deletes the old file"""
+        recipe = sample_recipe(user=self.user)
+        upload_image(self.client, recipe.id, 'red')
+        recipe.refresh_from_db()
+        old_path = recipe.image.path
+        upload_image(self.client, recipe.id, 'blue')
+        recipe.refresh_from_db()
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(recipe.image.path))
+        recipe.delete()
+        self.assertFalse(os.path.exists(recipe.image.path))
+
+    def test_shared_image_kept(self):
+        """Tests that a file stays while another recipe references it"""
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        upload_image(self.client, recipe1.id)
+        upload_image(self.client, recipe2.id)
+        recipe1.refresh_from_db()
+        recipe1.delete()
+        recipe2.refresh_from_db()
+
+        self.assertTrue(os.path.exists(recipe2.image.path))
+        recipe2.delete()
+        self.assertFalse(os.path.exists(recipe2.image.path))
+
+    def test_upload_image_warms_variants(self):
+        """Tests that a committed upload queues rendering its variants"""
+        recipe = sample_recipe(user=self.user)
+        upload_image(self.client, recipe.id)
+        recipe.refresh_from_db()
+        self.addCleanup(recipe.image.delete, save=False)
+
+        job = Job.objects.get()
+        self.assertEqual(job.task, warm_resized_images.task_name)
+        self.assertEqual(job.payload, {'recipe_id': recipe.id})
+
+    def test_release_waits_for_saves(self):
+        """Tests that a release waits for a save reusing the same file"""
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        upload_image(self.client, recipe1.id)
+        recipe1.refresh_from_db()
+        name = recipe1.image.name
+        Recipe.objects.filter(pk=recipe1.pk).update(image=None)
+
+        def release():
+            release_recipe_image(name)
+            connection.close()
+
+        with transaction.atomic():
+            lock_image(name, 'default', shared=True)
+            thread = threading.Thread(target=release)
+            thread.start()
+            time.sleep(0.3)
+            self.assertTrue(thread.is_alive())
+            Recipe.objects.filter(pk=recipe2.pk).update(image=name)
+        thread.join(5)
+
+        self.assertTrue(os.path.exists(recipe1.image.path))
+
+
+class ResizedImageTests(TestCase):
+    """Tests serving resized recipe images"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        cache_settings = override_settings(
+            RECIPE_IMAGE_CACHE_DIR=self.cache_dir.name
+        )
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        self.addCleanup(self.cache_dir.cleanup)
+
+        user = get_user_model().objects.create_user('test@test.com', 'x')
+        self.recipe = sample_recipe(user=user)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.new('RGB', (640, 320), 'red').save(ntf, format='PNG')
+            ntf.seek(0)
+            self.recipe.image.save('sample.png', File(ntf))
+        self.addCleanup(self.recipe.image.delete, save=False)
+
+    def resized_url(self, width, name=None):
+        name = name or os.path.basename(self.recipe.image.name)
+        return reverse('recipe-image-resized', args=[name, width])
+
+    def test_resized_image(self):
+        """Tests that an allowed width is rendered as WebP"""
+        res = self.client.get(self.resized_url(160))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        img = Image.open(io.BytesIO(b''.join(res.streaming_content)))
+        self.assertEqual(img.format, 'WEBP')
+        self.assertEqual(img.size, (160, 80))
+
+    def test_resized_image_cached(self):
+        """Tests that a variant is rendered once and then served from disk"""
+        with patch.object(
+            ResizedImageCache, '_render', autospec=True,
+            side_effect=ResizedImageCache._render
+        ) as render:
+            for _ in range(2):
+                res = self.client.get(self.resized_url(320))
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                b''.join(res.streaming_content)
+
+        self.assertEqual(render.call_count, 1)
+
+    def test_width_not_allowed(self):
+        """Tests that widths outside the allow-list are not served"""
+        res = self.client.get(self.resized_url(333))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_image(self):
+        """Tests that content names without file are not found"""
+        res = self.client.get(self.resized_url(160, f'{"0" * 64}.png'))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_recipe_id_not_accepted(self):
+        """Tests that images cannot be enumerated by recipe id"""
+        res = self.client.get(f'/media/recipe/{self.recipe.id}/160w.webp')
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unprocessable_image(self):
+        """Tests refusing sources over budget or that cannot be decoded"""
+        with override_settings(RECIPE_IMAGE_MAX_PIXELS=100):
+            res = self.client.get(self.resized_url(160))
+        self.assertEqual(
+            res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+        with open(self.recipe.image.path, 'wb') as image_file:
+            image_file.write(b'not an image')
+        res = self.client.get(self.resized_url(320))
+        self.assertEqual(
+            res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    def test_cache_evicts_least_recently_used(self):
+        """Tests that the cache drops the oldest variants over its budget"""
+        cache = ResizedImageCache(self.cache_dir.name, max_bytes=10 ** 6)
+        name, source = self.recipe.image.name, self.recipe.image.path
+        old = cache.get(source, name, 160)
+        recent = cache.get(source, name, 320)
+        os.utime(old, (0, 0))
+
+        cache.max_bytes = os.path.getsize(recent)
+        cache.evict()
+
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_cache_scans_only_over_budget(self):
+        """Tests that renders keep a size total instead of scanning"""
+        cache = ResizedImageCache(self.cache_dir.name, max_bytes=10 ** 6)
+        name, source = self.recipe.image.name, self.recipe.image.path
+        with patch.object(
+            ResizedImageCache, 'evict', autospec=True,
+            side_effect=ResizedImageCache.evict
+        ) as evict:
+            paths = [cache.get(source, name, width) for width in (160, 320)]
+            self.assertEqual(evict.call_count, 0)
+
+            cache.max_bytes = sum(os.path.getsize(path) for path in paths)
+            cache.get(source, name, 640)
+            self.assertEqual(evict.call_count, 1)
+
+        with open(os.path.join(self.cache_dir.name, 'size')) as size_file:
+            total = int(size_file.read())
+        self.assertEqual(total, sum(
+            entry.stat().st_size for entry in cache._entries()
+        ))
+        self.assertLessEqual(total, cache.max_bytes)
+
+
+def uploads_url(recipe_id, upload_id=None, finalize=False):
+    """Return the URL of resumable uploads of a recipe"""
+    if upload_id is None:
+        return reverse('recipe:recipe-start-upload', args=[recipe_id])
+    name = 'finalize-upload' if finalize else 'upload-chunk'
+    return reverse(f'recipe:recipe-{name}', args=[recipe_id, upload_id])
+
+
+class ResumableImageUploadTests(TestCase):
+    """Tests uploading recipe images in resumable chunks"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        upload_settings = override_settings(
+            RECIPE_UPLOAD_TEMP_DIR=self.temp_dir.name
+        )
+        upload_settings.enable()
+        self.addCleanup(upload_settings.disable)
+        self.addCleanup(self.temp_dir.cleanup)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='pass123',
+            name='Bob'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), 'green').save(buffer, format='PNG')
+        self.content = buffer.getvalue()
+
+    def start_upload(self, size=None):
+        res = self.client.post(uploads_url(self.recipe.id), {
+            'filename': 'photo.png',
+            'size': size or len(self.content),
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']
+
+    def put_chunk(self, upload_id, offset, chunk):
+        return self.client.put(
+            uploads_url(self.recipe.id, upload_id),
+            chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_resumable_upload(self):
+        """Tests uploading an image in chunks and finalizing it"""
+        upload_id = self.start_upload()
+        half = len(self.content) // 2
+        res = self.put_chunk(upload_id, 0, self.content[:half])
+        self.assertEqual(res.data['offset'], half)
+
+        res = self.client.get(uploads_url(self.recipe.id, upload_id))
+        self.assertEqual(res.data['offset'], half)
+        res = self.put_chunk(upload_id, half, self.content[half:])
+        self.assertEqual(res.data['offset'], len(self.content))
+
+        res = self.client.post(
+            uploads_url(self.recipe.id, upload_id, finalize=True)
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.addCleanup(self.recipe.image.delete, save=False)
+        with open(self.recipe.image.path, 'rb') as image:
+            self.assertEqual(image.read(), self.content)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_chunk_offset_mismatch(self):
+        """Tests that a chunk at the wrong offset reports the right one"""
+        upload_id = self.start_upload()
+        self.put_chunk(upload_id, 0, self.content[:10])
+        res = self.put_chunk(upload_id, 0, self.content[:10])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 10)
+
+    def test_chunk_past_declared_size(self):
+        """Tests that chunks cannot grow an upload past its size"""
+        upload_id = self.start_upload(size=10)
+        res = self.put_chunk(upload_id, 0, self.content[:11])
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+    def test_finalize_incomplete(self):
+        """Tests that an incomplete upload cannot be finalized"""
+        upload_id = self.start_upload()
+        self.put_chunk(upload_id, 0, self.content[:10])
+        res = self.client.post(
+            uploads_url(self.recipe.id, upload_id, finalize=True)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 10)
+
+    def test_finalize_invalid_image(self):
+        """Tests that a complete upload of garbage is rejected"""
+        upload_id = self.start_upload(size=10)
+        self.put_chunk(upload_id, 0, b'0123456789')
+        res = self.client.post(
+            uploads_url(self.recipe.id, upload_id, finalize=True)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_of_other_user_recipe(self):
+        """Tests that uploads are limited to the user recipes"""
+        other = get_user_model().objects.create_user('other@test.com', 'x')
+        recipe = sample_recipe(user=other)
+        res = self.client.post(uploads_url(recipe.id), {
+            'filename': 'photo.png',
+            'size': 10,
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=100)
+    def test_upload_size_capped(self):
+        """Tests that uploads over the image limit cannot start"""
+        res = self.client.post(uploads_url(self.recipe.id), {
+            'filename': 'photo.png',
+            'size': 101,
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def similar_url(recipe_id):
+    """Return the similar recipes URL of a recipe"""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+class RecipeSimilarTests(TestCase):
+    """Tests ranking similar recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='pass123',
+            name='Bob'
+        )
+        self.client.force_authenticate(self.user)
+        self.flour = sample_ingredient(user=self.user, name='Flour')
+        self.egg = sample_ingredient(user=self.user, name='Egg')
+        self.milk = sample_ingredient(user=self.user, name='Milk')
+        self.dessert = sample_tag(user=self.user, name='Dessert')
+
+    def test_attr_counts_maintained(self):
+        """Tests that recipes keep their tag and ingredient counts"""
+        recipe = sample_recipe(user=self.user)
+        recipe.ingredients.add(self.flour, self.egg)
+        self.dessert.recipe_set.add(recipe)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 2)
+        self.assertEqual(recipe.tag_count, 1)
+
+        recipe.ingredients.remove(self.egg)
+        self.dessert.delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 1)
+        self.assertEqual(recipe.tag_count, 0)
+
+    def test_similar_recipes_ranked(self):
+        """Tests ranking recipes by shared ingredients and tags"""
+        recipe = sample_recipe(user=self.user, title='Pancakes')
+        recipe.ingredients.add(self.flour, self.egg, self.milk)
+        recipe.tags.add(self.dessert)
+        crepes = sample_recipe(user=self.user, title='Crepes')
+        crepes.ingredients.add(self.flour, self.egg, self.milk)
+        bread = sample_recipe(user=self.user, title='Bread')
+        bread.ingredients.add(self.flour)
+        unrelated = sample_recipe(user=self.user, title='Salad')
+        unrelated.ingredients.add(
+            sample_ingredient(user=self.user, name='Lettuce')
+        )
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [crepes.id, bread.id])
+        self.assertAlmostEqual(res.data[0]['similarity'], 0.7)
+        self.assertAlmostEqual(res.data[1]['similarity'], 0.7 / 3)
+
+    def test_similar_limited_to_user(self):
+        """Tests that other users recipes are never suggested"""
+        other = get_user_model().objects.create_user('other@test.com', 'x')
+        recipe = sample_recipe(user=self.user)
+        recipe.ingredients.add(self.flour)
+        theirs = sample_recipe(user=other)
+        theirs.ingredients.add(self.flour)
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.data, [])
+
+
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+
+
+class ShoppingListTests(TestCase):
+    """Tests merging the ingredients of several recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='pass123',
+            name='Bob'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_shopping_list(self):
+        """Tests that shared ingredients are listed once with their recipes"""
+        flour = sample_ingredient(user=self.user, name='Flour')
+        egg = sample_ingredient(user=self.user, name='Egg')
+        salt = sample_ingredient(user=self.user, name='Salt')
+        recipe1 = sample_recipe(user=self.user)
+        recipe1.ingredients.add(flour, egg)
+        recipe2 = sample_recipe(user=self.user)
+        recipe2.ingredients.add(flour)
+        recipe3 = sample_recipe(user=self.user)
+        recipe3.ingredients.add(salt)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                SHOPPING_LIST_URL,
+                {'recipes': f'{recipe1.id},{recipe2.id}'}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': egg.id, 'name': 'Egg', 'recipe_count': 1,
+             'recipes': [recipe1.id]},
+            {'id': flour.id, 'name': 'Flour', 'recipe_count': 2,
+             'recipes': [recipe1.id, recipe2.id]},
+        ])
+
+    def test_shopping_list_other_user_recipes(self):
+        """Tests that recipes of other users are left out"""
+        other = get_user_model().objects.create_user('other@test.com', 'x')
+        recipe = sample_recipe(user=other)
+        recipe.ingredients.add(sample_ingredient(user=other))
+        res = self.client.get(SHOPPING_LIST_URL, {'recipes': recipe.id})
+
+        self.assertEqual(res.data, [])
+
+    @override_settings(RECIPE_SHOPPING_LIST_MAX=2)
+    def test_shopping_list_invalid(self):
+        """Tests rejecting missing, malformed or too many ids"""
+        for params in ({}, {'recipes': 'a,b'}, {'recipes': '1,2,3'}):
+            res = self.client.get(SHOPPING_LIST_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,139 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+SYNC_URL = reverse('recipe:sync')
+
+
+def sample_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PublicSyncApiTests(TestCase):
+    """Tests unauthenticated sync API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Tests that authentication is required to sync"""
+        res = self.client.get(SYNC_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class PrivateSyncApiTests(TestCase):
+    """Tests authenticated sync API access"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test123',
+            name='test'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_full_sync(self):
+        """Tests that a sync without cursor returns everything"""
+        other = get_user_model().objects.create_user('other@test.com', 'x')
+        sample_recipe(user=other)
+        recipe = sample_recipe(user=self.user)
+        Tag.objects.create(user=self.user, name='Vegan')
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recipe.id])
+        self.assertEqual(len(res.data['tags']), 1)
+        self.assertFalse(res.data['has_more'])
+
+    def test_sync_since_cursor(self):
+        """Tests that only changes after the cursor are returned"""
+        recipe = sample_recipe(user=self.user)
+        unchanged = sample_recipe(user=self.user, title='Unchanged')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        recipe.ingredients.add(ingredient)
+        doomed_id = unchanged.id
+        unchanged.delete()
+        res = self.client.get(SYNC_URL, {'since': cursor})
+
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recipe.id])
+        self.assertEqual(
+            res.data['recipes'][0]['ingredients'],
+            [ingredient.id]
+        )
+        self.assertEqual(res.data['ingredients'][0]['recipe_count'], 1)
+        self.assertEqual(res.data['tags'], [])
+        self.assertEqual(
+            [(d['model'], d['id']) for d in res.data['deleted']],
+            [('recipe', doomed_id)]
+        )
+
+        res = self.client.get(SYNC_URL, {'since': res.data['cursor']})
+        self.assertEqual(res.data['recipes'], [])
+        self.assertEqual(res.data['deleted'], [])
+
+    def test_sync_pages(self):
+        """Tests walking a sync in pages"""
+        recipes = [sample_recipe(user=self.user) for _ in range(3)]
+        res = self.client.get(SYNC_URL, {'page_size': 2})
+        self.assertTrue(res.data['has_more'])
+        seen = [r['id'] for r in res.data['recipes']]
+
+        res = self.client.get(
+            SYNC_URL,
+            {'page_size': 2, 'since': res.data['cursor']}
+        )
+        seen += [r['id'] for r in res.data['recipes']]
+
+        self.assertFalse(res.data['has_more'])
+        self.assertEqual(seen, [recipe.id for recipe in recipes])
+
+    def test_sync_invalid_cursor(self):
+        """Tests rejecting a malformed cursor"""
+        res = self.client.get(SYNC_URL, {'since': 'garbage'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sync_cursor_out_of_range(self):
+        """Tests rejecting a cursor past the supported dates"""
+        data = {'recipes': [10 ** 20, 1]}
+        cursor = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+        res = self.client.get(SYNC_URL, {'since': cursor})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(SYNC_SETTLE_SECONDS=60)
+    def test_sync_resends_unsettled_changes(self):
+        """Tests that cursors stop short of changes that may still commit"""
+        old = sample_recipe(user=self.user, title='Old')
+        Recipe.objects.filter(pk=old.pk).update(
+            updated_at=timezone.now() - timedelta(minutes=5)
+        )
+        recent = sample_recipe(user=self.user, title='Recent')
+        res = self.client.get(SYNC_URL)
+        self.assertEqual(
+            [r['id'] for r in res.data['recipes']], [old.id, recent.id]
+        )
+
+        res = self.client.get(SYNC_URL, {'since': res.data['cursor']})
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recent.id])
+        self.assertFalse(res.data['has_more'])
@@ -98,6 +98,7 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
+        tag1.refresh_from_db()
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
         self.assertIn(serializer1.data, res.data)
@@ -124,3 +125,17 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
         self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['recipe_count'], 2)
+
+    def test_multi_get_tags(self):
+        """Tests fetching tags by ids in the requested order"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        dessert = Tag.objects.create(user=self.user, name='Dessert')
+        res = self.client.get(TAGS_URL, {'ids': f'{dessert.id},0,{vegan.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']],
+            ['Dessert', 'Vegan']
+        )
+        self.assertEqual(res.data['not_found'], [0])
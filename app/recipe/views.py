@@ -1,18 +1,97 @@
+from decimal import Decimal, InvalidOperation
+from functools import partial
+
+from django.conf import settings
+from django.db import router, transaction
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+
+from django.utils.translation import ugettext_lazy as _
+
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework import viewsets, mixins, status
+from rest_framework import viewsets, mixins, status, generics
+from rest_framework.exceptions import ValidationError
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
 
-from core.models import Tag, Ingredient, Recipe
+from batch.authentication import BatchSubRequestAuthentication
+from core.idempotency import idempotent
+from core.sharding import UserShardMixin
+from core.models import Tag, Ingredient, Recipe, RecipeStats, ImageUpload, \
+                        IngredientPair, RECIPE_IMAGE_DIR
 from recipe import serializers
+from recipe.images import LimitedUploadHandler, resized_image_cache, \
+                          CompletedUpload, OffsetMismatch, append_chunk, \
+                          upload_offset, MULTIPART_OVERHEAD
+from recipe.tasks import warm_resized_images
+from recipe.sync import decode_cursor, encode_cursor, changes_since
+from recipe.pagination import KeysetPagination
+from recipe.parsers import ColumnarParser
+from recipe.fragments import recipe_fragments
+from recipe.renderers import ColumnarRenderer, FragmentJSONRenderer
+
+# Fields recipes can be sorted by with the ordering param
+RECIPE_ORDERINGS = ('title', 'time_minutes', 'price', 'id')
+
+# Relations the recipe list can embed with the expand param
+RECIPE_EXPANSIONS = ('tags', 'ingredients')
+
+# URL pattern of a resumable upload id
+UPLOAD_ID = r'(?P<upload_id>[0-9a-f]{8}(?:-[0-9a-f]{4}){3}-[0-9a-f]{12})'
+
+
+class MultiGetMixin:
+    """Lets a list endpoint return the objects of an ?ids=1,2,3 list
+
+    The objects come in the requested order from a fixed number of
+    queries, along with the requested ids that were not found.
+    """
+    multi_get_prefetch = ()
+
+    def list(self, request, *args, **kwargs):
+        if 'ids' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            ids = list(dict.fromkeys(
+                int(pk) for pk in request.query_params['ids'].split(',')
+            ))
+        except ValueError:
+            raise ValidationError(
+                {'ids': [_('A comma separated list of ids is required')]}
+            )
+        if len(ids) > settings.MULTI_GET_MAX_IDS:
+            raise ValidationError({'ids': [
+                _('At most {max} ids per request').format(
+                    max=settings.MULTI_GET_MAX_IDS
+                )
+            ]})
+
+        found = {
+            obj.pk: obj for obj in self.get_queryset().filter(
+                pk__in=ids
+            ).prefetch_related(*self.multi_get_prefetch)
+        }
+        serializer = self.get_serializer(
+            [found[pk] for pk in ids if pk in found],
+            many=True
+        )
+        return Response({
+            'results': serializer.data,
+            'not_found': [pk for pk in ids if pk not in found],
+        })
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
-                             mixins.ListModelMixin,
-                             mixins.CreateModelMixin):
+class BaseRecipeAttrViewSet(UserShardMixin,
+                            MultiGetMixin,
+                            viewsets.GenericViewSet,
+                            mixins.ListModelMixin,
+                            mixins.CreateModelMixin):
     """Base for user owned recipe attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (TokenAuthentication,
+                              BatchSubRequestAuthentication)
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
@@ -22,11 +101,15 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe_count__gt=0)
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('-name').distinct()
+        ).order_by('-name')
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         """Creates a new tag"""
@@ -44,13 +127,47 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
 
+    def get_serializer_class(self):
+        """Returns apropriate serializer class"""
+        if self.action == 'used_with':
+            return serializers.IngredientPairSerializer
+
+        return self.serializer_class
+
+    @action(methods=['GET'], detail=True, url_path='used-with')
+    def used_with(self, request, pk=None):
+        """Returns the ingredients most often used along with this one"""
+        ingredient = self.get_object()
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.INGREDIENT_PAIRS_TOP
+            ))
+        except ValueError:
+            raise ValidationError({'limit': [_('A number is required')]})
+
+        pairs = IngredientPair.objects.filter(
+            user=request.user,
+            ingredient=ingredient
+        ).select_related('other').order_by('-count', 'other_id')
+        limit = min(max(limit, 1), settings.INGREDIENT_PAIRS_MAX_TOP)
+        serializer = self.get_serializer(pairs[:limit], many=True)
+        return Response(serializer.data)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(UserShardMixin, MultiGetMixin, viewsets.ModelViewSet):
     """Manages recipes in the database"""
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    multi_get_prefetch = ('tags', 'ingredients')
+    authentication_classes = (TokenAuthentication,
+                              BatchSubRequestAuthentication)
     permission_classes = (IsAuthenticated,)
+    renderer_classes = [FragmentJSONRenderer] + \
+        api_settings.DEFAULT_RENDERER_CLASSES + [ColumnarRenderer]
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + [ColumnarParser]
+    # Set to upload by the image actions, see TokenBucketThrottle
+    throttle_scope = None
+    pagination_class = KeysetPagination
 
     def _params_to_ints(self, qs):
         """Converts a list of string IDs to a list of integers"""
@@ -70,31 +187,160 @@ class RecipeViewSet(viewsets.ModelViewSet):
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
-        return queryset.filter(user=self.request.user).order_by('-title')
+        queryset = queryset.filter(**self._range_filters())
+        if self.action == 'list':
+            queryset = queryset.prefetch_related(*self._expand())
+
+        return queryset.filter(user=self.request.user).order_by(
+            *self._ordering()
+        )
+
+    def _expand(self):
+        """Returns the relations requested with the expand param"""
+        expand = self.request.query_params.get('expand', '')
+        relations = [name for name in expand.split(',') if name]
+        unknown = set(relations) - set(RECIPE_EXPANSIONS)
+        if unknown:
+            raise ValidationError({'expand': [
+                _('Expand must be among {relations}').format(
+                    relations=', '.join(RECIPE_EXPANSIONS)
+                )
+            ]})
+
+        return list(dict.fromkeys(relations))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['included'] = getattr(self, 'included', None)
+        return context
+
+    def list(self, request, *args, **kwargs):
+        """Lists recipes, sharing the ?expand= relations in `included`
+
+        Related objects are serialized once in a top-level map keyed by id
+        instead of once per recipe using them.
+        """
+        self.included = {relation: {} for relation in self._expand()}
+        if not self.included and 'ids' not in request.query_params and \
+                isinstance(request.accepted_renderer, FragmentJSONRenderer):
+            return self._list_fragments()
+
+        response = super().list(request, *args, **kwargs)
+        if self.included:
+            if isinstance(response.data, list):
+                response.data = {'results': response.data}
+            response.data['included'] = self.included
+
+        return response
+
+    def _list_fragments(self):
+        """Lists recipes from their cached JSON, see recipe.fragments"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(recipe_fragments(page))
+
+        return Response(recipe_fragments(list(queryset)))
+
+    def _range_filters(self):
+        """Returns the lookups of the time_minutes and price range params"""
+        lookups = {}
+        for field_name, parse in (('time_minutes', int), ('price', Decimal)):
+            for suffix, lookup in (('min', 'gte'), ('max', 'lte')):
+                value = self.request.query_params.get(f'{field_name}_{suffix}')
+                if value is None:
+                    continue
+                try:
+                    lookups[f'{field_name}__{lookup}'] = parse(value)
+                except (ValueError, InvalidOperation):
+                    raise ValidationError({f'{field_name}_{suffix}': [
+                        _('A number is required')
+                    ]})
+
+        return lookups
+
+    def _ordering(self):
+        """Returns the requested sort order, tie-broken by id
+
+        Every order is backed by an index on (user, field, id).
+        """
+        ordering = self.request.query_params.get('ordering', '-title')
+        field_name = ordering.lstrip('-')
+        if field_name not in RECIPE_ORDERINGS or ordering.count('-') > 1:
+            raise ValidationError({'ordering': [
+                _('Ordering must be one of {fields}, optionally prefixed '
+                  'with -').format(fields=', '.join(RECIPE_ORDERINGS))
+            ]})
+        if field_name == 'id':
+            return (ordering,)
+
+        return (ordering, '-id' if ordering.startswith('-') else 'id')
 
     def get_serializer_class(self):
         """Returns apropriate serializer class"""
         if self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
-        elif self.action == 'upload_image':
+        elif self.action in ('upload_image', 'finalize_upload'):
             return serializers.RecipeImageSerializer
+        elif self.action in ('start_upload', 'upload_chunk'):
+            return serializers.ImageUploadSerializer
+        elif self.action == 'stats':
+            return serializers.RecipeStatsSerializer
+        elif self.action == 'similar':
+            return serializers.RecipeSimilarSerializer
+        elif self.action == 'shopping_list':
+            return serializers.ShoppingListItemSerializer
 
         return self.serializer_class
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """Creates one recipe, or many when given a list"""
+        serializer = self.get_serializer(
+            data=request.data,
+            many=isinstance(request.data, list)
+        )
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic(using=router.db_for_write(Recipe)):
+            self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    def _upload_too_large(self):
+        """Returns the response for uploads over the size limit"""
+        return Response(
+            {'image': [_('The upload is too large')]},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            throttle_scope='upload')
+    @idempotent
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
         recipe = self.get_object()
+        max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length > max_bytes + MULTIPART_OVERHEAD:
+            return self._upload_too_large()
+
+        request.upload_handlers.insert(
+            0, LimitedUploadHandler(request._request, max_bytes)
+        )
+        data = request.data
+        if getattr(request._request, 'upload_limit_exceeded', False):
+            return self._upload_too_large()
+
         serializer = self.get_serializer(
             recipe,
-            data=request.data
+            data=data
         )
 
         if serializer.is_valid():
             serializer.save()
+            self._warm_image(recipe)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -104,3 +350,194 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    def _warm_image(self, recipe):
+        """Queues the rendering of the resized variants of a new image"""
+        transaction.on_commit(
+            partial(warm_resized_images.enqueue, recipe_id=recipe.pk),
+            using=router.db_for_write(Recipe, instance=recipe)
+        )
+
+    def _get_upload(self, upload_id):
+        """Returns a resumable upload of the requested recipe"""
+        return get_object_or_404(
+            ImageUpload,
+            pk=upload_id,
+            recipe=self.get_object()
+        )
+
+    @action(methods=['POST'], detail=True, url_path='uploads',
+            throttle_scope='upload')
+    def start_upload(self, request, pk=None):
+        """Starts a resumable upload of an image of a declared size"""
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user, recipe=recipe)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(methods=['GET', 'PUT'], detail=True,
+            url_path=f'uploads/{UPLOAD_ID}', throttle_scope='upload')
+    def upload_chunk(self, request, pk=None, upload_id=None):
+        """Reports the offset of an upload, or appends a chunk at it
+
+        Chunks are raw request bodies starting at the Upload-Offset header.
+        """
+        upload = self._get_upload(upload_id)
+        if request.method == 'PUT':
+            try:
+                offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+            except (KeyError, ValueError):
+                return Response(
+                    {'offset': [_('A numeric Upload-Offset is required')]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            if offset + length > upload.size:
+                return self._upload_too_large()
+
+            try:
+                append_chunk(upload.path, request.stream, offset)
+            except OffsetMismatch as exc:
+                return Response(
+                    {'offset': exc.offset},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+        serializer = self.get_serializer(upload)
+        return Response(serializer.data)
+
+    @action(methods=['POST'], detail=True,
+            url_path=f'uploads/{UPLOAD_ID}/finalize',
+            throttle_scope='upload')
+    def finalize_upload(self, request, pk=None, upload_id=None):
+        """Validates a complete upload and attaches it to the recipe"""
+        upload = self._get_upload(upload_id)
+        offset = upload_offset(upload.path)
+        if offset != upload.size:
+            return Response(
+                {'offset': offset},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        with open(upload.path, 'rb') as part:
+            serializer = self.get_serializer(
+                upload.recipe,
+                data={'image': CompletedUpload(part, name=upload.filename)}
+            )
+            try:
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                self._warm_image(upload.recipe)
+            finally:
+                upload.delete()
+
+        return Response(serializer.data)
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """Returns the other user recipes most similar to this one"""
+        recipe = self.get_object()
+        queryset = Recipe.objects.similar_to(recipe).prefetch_related(
+            'tags', 'ingredients'
+        )[:settings.RECIPE_SIMILAR_LIMIT]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(methods=['GET'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        """Returns the merged ingredients of the requested recipes"""
+        try:
+            pks = set(self._params_to_ints(request.query_params['recipes']))
+        except (KeyError, ValueError):
+            raise ValidationError(
+                {'recipes': [_('A comma separated list of ids is required')]}
+            )
+        if len(pks) > settings.RECIPE_SHOPPING_LIST_MAX:
+            raise ValidationError({'recipes': [
+                _('At most {max} recipes per shopping list').format(
+                    max=settings.RECIPE_SHOPPING_LIST_MAX
+                )
+            ]})
+
+        items = Recipe.objects.shopping_list(request.user, pks)
+        for item in items:
+            item['recipes'].sort()
+        serializer = self.get_serializer(items, many=True)
+        return Response(serializer.data)
+
+    @action(methods=['GET'], detail=False)
+    def stats(self, request):
+        """Returns aggregated statistics of the user recipes"""
+        user = request.user
+        if settings.RECIPE_STATS_MATERIALIZED:
+            stats = RecipeStats.objects.filter(user=user).first()
+            if stats is None:
+                stats = RecipeStats.objects.refresh(user)
+        else:
+            stats = RecipeStats.objects.compute(user)
+
+        for name, model in (('tags', Tag), ('ingredients', Ingredient)):
+            setattr(stats, f'top_{name}', model.objects.filter(
+                user=user,
+                recipe_count__gt=0
+            ).order_by('-recipe_count', 'name')[:settings.RECIPE_STATS_TOP])
+
+        serializer = self.get_serializer(stats)
+        return Response(serializer.data)
+
+
+class SyncView(UserShardMixin, generics.GenericAPIView):
+    """Returns the recipes, tags and ingredients changed since a cursor"""
+    serializer_class = serializers.SyncSerializer
+    authentication_classes = (TokenAuthentication,
+                              BatchSubRequestAuthentication)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        try:
+            positions = decode_cursor(request.query_params.get('since'))
+            page_size = min(
+                int(request.query_params.get(
+                    'page_size', settings.SYNC_PAGE_SIZE
+                )),
+                settings.SYNC_MAX_PAGE_SIZE
+            )
+        except ValueError:
+            raise ValidationError(_('Invalid sync cursor or page size'))
+
+        changes, positions, has_more = changes_since(
+            request.user, positions, max(page_size, 1)
+        )
+        serializer = self.get_serializer(dict(
+            changes,
+            cursor=encode_cursor(positions),
+            has_more=has_more
+        ))
+        return Response(serializer.data)
+
+
+def resized_image(request, name, width):
+    """Serves a recipe image resized to one of the allowed widths
+
+    Images are addressed by the content name of their file, so only those
+    who were given the image URL can get its variants.
+    """
+    width = int(width)
+    if width not in settings.RECIPE_IMAGE_WIDTHS:
+        raise Http404
+
+    storage = Recipe._meta.get_field('image').storage
+    image = f'{RECIPE_IMAGE_DIR}/{name[:2]}/{name}'
+    try:
+        path = resized_image_cache().get(storage.path(image), image, width)
+    except FileNotFoundError:
+        raise Http404
+    except (OSError, ValueError):
+        # Sources over the pixel budget or that Pillow cannot decode
+        return HttpResponse(status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    response = FileResponse(open(path, 'rb'), content_type='image/webp')
+    response['Cache-Control'] = 'public, max-age=3600'
+    return response
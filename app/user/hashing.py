@@ -0,0 +1,86 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class HasherBusy(Exception):
+    """Raised when the password hashing pool cannot take more work"""
+
+
+class BoundedExecutor:
+    """Thread pool refusing work once its queue reaches a fixed depth"""
+
+    def __init__(self, max_workers, max_queue):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='hasher',
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def submit(self, fn, *args):
+        """Schedules fn(*args), raising HasherBusy when saturated"""
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return self._executor.submit(self._call, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _call(self, fn, *args):
+        """Runs a task, freeing its slot before the result is published"""
+        try:
+            return fn(*args)
+        finally:
+            self._slots.release()
+
+    def run(self, fn, *args, timeout=None):
+        """Runs fn(*args) in the pool and waits for its result"""
+        try:
+            return self.submit(fn, *args).result(timeout=timeout)
+        except TimeoutError:
+            raise HasherBusy()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the process wide password hashing pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = BoundedExecutor(
+                    settings.LOGIN_HASHER_WORKERS,
+                    settings.LOGIN_HASHER_QUEUE,
+                )
+
+    return _executor
+
+
+def _verify(password, encoded):
+    """Checks a password, also telling if its hash must be upgraded"""
+    if encoded is None:
+        # Hash anyway so unknown emails take as long as known ones
+        make_password(password)
+        return False, False
+
+    must_update = []
+    valid = check_password(password, encoded, setter=must_update.append)
+    return valid, bool(must_update)
+
+
+def verify_password(password, encoded):
+    """Verifies a password against its hash in the bounded hashing pool
+
+    Returns a (valid, must_update) tuple. Raises HasherBusy when the pool
+    queue is full or the hash does not finish within the timeout.
+    """
+    return get_executor().run(
+        _verify, password, encoded,
+        timeout=settings.LOGIN_HASHER_TIMEOUT,
+    )
@@ -0,0 +1,80 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+
+from user.hashing import BoundedExecutor, HasherBusy
+
+
+class Command(BaseCommand):
+    """Django command measuring login latency against hasher cost"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', default='50000,100000,150000',
+            help='Comma separated PBKDF2 iteration counts to compare',
+        )
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--clients', type=int, default=32)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--queue', type=int, default=16)
+
+    def _run(self, hasher, logins, clients, workers, queue):
+        """Fires concurrent logins through a bounded pool"""
+        encoded = hasher.encode('pass123', hasher.salt())
+        executor = BoundedExecutor(workers, queue)
+        latencies = []
+        rejected = []
+        remaining = iter(range(logins))
+        lock = threading.Lock()
+
+        def client():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                start = time.perf_counter()
+                try:
+                    executor.run(hasher.verify, 'pass123', encoded)
+                except HasherBusy:
+                    rejected.append(time.perf_counter() - start)
+                    time.sleep(0.01)
+                else:
+                    latencies.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return latencies, rejected, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"iterations":>10}{"hash ms":>10}{"p50 ms":>10}{"p95 ms":>10}'
+            f'{"429s":>8}{"logins/s":>10}'
+        )
+        for iterations in options['iterations'].split(','):
+            hasher = type('BenchHasher', (PBKDF2PasswordHasher,), {
+                'iterations': int(iterations),
+            })()
+            start = time.perf_counter()
+            hasher.encode('pass123', hasher.salt())
+            single = (time.perf_counter() - start) * 1000
+
+            latencies, rejected, elapsed = self._run(
+                hasher, options['logins'], options['clients'],
+                options['workers'], options['queue'],
+            )
+            latencies = sorted(latencies) or [0]
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            self.stdout.write(
+                f'{iterations:>10}{single:>10.1f}'
+                f'{statistics.median(latencies) * 1000:>10.1f}'
+                f'{p95 * 1000:>10.1f}{len(rejected):>8}'
+                f'{len(latencies) / elapsed:>10.1f}'
+            )
@@ -1,7 +1,14 @@
-from rest_framework import serializers
-from django.contrib.auth import get_user_model, authenticate
+from rest_framework import serializers, exceptions
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
 from django.utils.translation import ugettext_lazy as _
 from core import models
+from user import hashing
+
+# Permission caches Django keeps on a user instance once it is checked
+AUTH_CACHE_ATTRS = ('_perm_cache', '_user_perm_cache', '_group_perm_cache')
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the user object"""
@@ -15,15 +22,28 @@ class UserSerializer(serializers.ModelSerializer):
         return get_user_model().objects.create_user(**validated_data)
 
     def update(self, instance, validated_data):
-        """Update an user, setting the password correctly and returning it"""
+        """Update an user, setting the password correctly and returning it
+
+        The password is hashed before saving and only the changed columns
+        are written, in a single UPDATE.
+        """
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
+        update_fields = []
+        for attr, value in validated_data.items():
+            if getattr(instance, attr) != value:
+                setattr(instance, attr, value)
+                update_fields.append(attr)
 
         if password:
-            user.set_password(password)
-            user.save()
+            instance.set_password(password)
+            update_fields.append('password')
+
+        if update_fields:
+            instance.save(update_fields=update_fields)
+            for attr in AUTH_CACHE_ATTRS:
+                instance.__dict__.pop(attr, None)
 
-        return user
+        return instance
 
 
 class AuthTokenSerializer(serializers.Serializer):
@@ -34,18 +54,45 @@ class AuthTokenSerializer(serializers.Serializer):
         trim_whitespace=False,
     )
 
+    def _get_user(self, email):
+        """Fetches the user along with its token in a single query"""
+        user_model = get_user_model()
+        try:
+            return user_model._default_manager.select_related(
+                'auth_token'
+            ).get(**{user_model.USERNAME_FIELD: email})
+        except user_model.DoesNotExist:
+            return None
+
     def validate(self, attrs):
-        """Validate and authenticate the user"""
+        """Validate and authenticate the user
+
+        The password hash runs in a bounded pool so login storms cannot
+        starve the workers, failing fast with a 429 when it is saturated.
+        """
         email = attrs.get('email')
         password = attrs.get('password')
-        user = authenticate(
-            request=self.context.get('request'),
-            username=email,
-            password=password,
-        )
-        if not user:
+        user = self._get_user(email)
+        try:
+            valid, must_update = hashing.verify_password(
+                password,
+                user.password if user else None
+            )
+        except hashing.HasherBusy:
+            raise exceptions.Throttled(wait=settings.LOGIN_HASHER_RETRY_AFTER)
+
+        if not valid or not user.is_active:
+            user_login_failed.send(
+                sender=__name__,
+                credentials={'username': email},
+                request=self.context.get('request'),
+            )
             msg  = _('Unable to authenticate with provided credentials')
             raise serializers.ValidationError(msg, code='authentication')
 
+        if must_update:
+            user.set_password(password)
+            user.save(update_fields=['password'])
+
         attrs['user'] = user
         return attrs
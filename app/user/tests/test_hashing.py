@@ -0,0 +1,32 @@
+import threading
+
+from django.contrib.auth.hashers import make_password
+from django.test import SimpleTestCase
+
+from user.hashing import BoundedExecutor, HasherBusy, verify_password
+
+
+class HashingTests(SimpleTestCase):
+
+    def test_verify_password(self):
+        """Test verifying passwords in the hashing pool"""
+        encoded = make_password('pass123')
+
+        self.assertEqual(verify_password('pass123', encoded), (True, False))
+        self.assertEqual(verify_password('wrong', encoded), (False, False))
+        self.assertEqual(verify_password('pass123', None), (False, False))
+
+    def test_bounded_executor_rejects_when_full(self):
+        """Test that the pool refuses work beyond its queue depth"""
+        executor = BoundedExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+        running = executor.submit(release.wait)
+        queued = executor.submit(release.wait)
+
+        with self.assertRaises(HasherBusy):
+            executor.submit(release.wait)
+
+        release.set()
+        running.result()
+        queued.result()
+        self.assertTrue(executor.run(lambda: True))
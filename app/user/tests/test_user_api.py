@@ -1,10 +1,17 @@
+from unittest.mock import patch
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from user.hashing import HasherBusy
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -92,6 +99,35 @@ class PublicUserApiTests(TestCase):
         self.assertNotIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_token_reuses_existing(self):
+        """Test that an existing token is returned without a new write"""
+        payload = {'email': 'test@example.com', 'password': 'pass123'}
+        user = create_user(**payload)
+        token = Token.objects.create(user=user)
+        with self.assertNumQueries(2):
+            res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['token'], token.key)
+
+    def test_create_token_inactive_user(self):
+        """Test that inactive users cannot get a token"""
+        payload = {'email': 'test@example.com', 'password': 'pass123'}
+        create_user(is_active=False, **payload)
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch('user.hashing.verify_password', side_effect=HasherBusy)
+    def test_create_token_hasher_saturated(self, verify):
+        """Test that logins fail fast when the hashing pool is full"""
+        payload = {'email': 'test@example.com', 'password': 'pass123'}
+        create_user(**payload)
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertNotIn('token', res.data)
+
     def test_retrieve_user_unauthorized(self):
         "Test that authentication is required for users"
         res = self.client.get(ME_URL)
@@ -133,3 +169,31 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
+
+    def test_update_user_single_write(self):
+        """Test that a profile and password change is one UPDATE"""
+        payload = {'name': 'new name', 'password': 'new password'}
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.patch(ME_URL, payload)
+
+        updates = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('UPDATE')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password(payload['password']))
+
+    def test_update_user_only_changed_columns(self):
+        """Test that only changed columns are written"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.patch(ME_URL, {'name': 'new name'})
+
+        updates = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('UPDATE')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"name"', updates[0])
+        self.assertNotIn('"password"', updates[0])
+        self.assertNotIn('"email"', updates[0])